@@ -6,97 +6,182 @@ import socketio
 
 from app.core import schemas
 from app.core.logger import logger
-from app.core.auth import socket_auth
+from app.core.rooms import RoomMembership
+from app.core.socket_auth import socket_auth
 from app.core.config import get_settings
+from app.core.scheduler import scheduler
 from app.core.sockets import socket_namespace, socket_event, socket_publish
-from app.api.v1.state import Interval, state, init_state, clear_state, State
+from app.api.v1.state import store, init_state, clear_state, State
 
 settings = get_settings()
 
+if settings.state_sync not in ("events", "patches"):
+    raise ValueError(f"Unsupported state sync mode: {settings.state_sync}")
+
+
+def field_event(name: str) -> str | None:
+    """
+    The event a state change is broadcast as: its own event, or none with
+    STATE_SYNC=patches, where every change reaches clients as a `state_patch`.
+    """
+    return name if settings.state_sync == "events" else None
+
 
 @socket_namespace("/v1")
 class SocketV1Namespace(socketio.AsyncNamespace):
-    rooms = {}
+    def __init__(self, namespace=None):
+        super().__init__(namespace)
+        self.membership = RoomMembership()
+
+    def room_of(self, sid: str) -> str | None:
+        return self.membership.room_of(sid)
+
+    async def state_version(self, room: str) -> int:
+        return await store.version(room)
 
     @socket_auth
     async def on_connect(self, sid, environ, _auth):
         room = parse_qs(environ["QUERY_STRING"])["room"][0]
         await self.enter_room(sid, room)
-        self.rooms[sid] = room
-        init_state(room)
+        if self.membership.join(sid, room):
+            state_ = await init_state(room)
+            if state_.interval is None:
+                # every worker with members runs a ticker; `store.claim_ticker` picks the one that ticks
+                state_.interval = scheduler.schedule(lambda: self._on_tick(room), interval=settings.interval)
 
     async def on_disconnect(self, sid: str, _reason):
-        room = self.rooms[sid]
-        if len([x for x in self.rooms.values() if x == room]) == 0:
-            clear_state(room)
+        room, emptied = self.membership.leave(sid)
+        if emptied:
+            await clear_state(room)
 
-    @socket_event("get_state", response=schemas.GetStatePayload, ack=True, key_builder=lambda: {}, cache_enabled=True)
+    @socket_event("get_state", response=schemas.GetStatePayload, ack=True, cache_enabled=True)
     async def on_get_state(self, sid: str):
-        raw = state.get(self.rooms.get(sid, "MISSING"), State()).to_dict()
-        return schemas.GetStatePayload(**raw).model_dump()
+        return await self._snapshot(self.room_of(sid) or "MISSING")
+
+    @socket_event("get_state_delta", payload=schemas.StateDeltaRequestPayload, response=schemas.StateDeltaPayload,
+                  ack=True)
+    async def on_get_state_delta(self, sid: str, data: schemas.StateDeltaRequestPayload):
+        room = self.room_of(sid) or "MISSING"
+        patch = await store.delta(room, data.since)
+        if patch is not None:
+            return schemas.StateDeltaPayload(patch=schemas.StatePatchPayload(**patch))
+        # too far behind, or behind on writes made by another worker
+        return schemas.StateDeltaPayload(snapshot=await self._snapshot(room))
+
+    async def _snapshot(self, room: str) -> schemas.GetStatePayload:
+        state_ = await store.load(room)
+        raw = (state_ or State(timestamp=datetime.now(tz=timezone.utc))).to_dict()
+        return schemas.GetStatePayload(**raw)
+
+    @socket_publish("state_patch", payload=schemas.StatePatchPayload)
+    async def _sync(self, room: str):
+        """
+        Broadcast the room's latest change as a `state_patch` (STATE_SYNC=patches).
+
+        Clients apply a patch whose `from_version` is the version they hold,
+        ignore ones they are already past, and otherwise catch up with
+        `get_state_delta`.
+        """
+        if settings.state_sync != "patches":
+            return
+        patch = store.last_patch(room)
+        if patch is not None:
+            await self.emit("state_patch", schemas.StatePatchPayload(**patch), room=room)
+
+    async def _state(self, room: str) -> State:
+        # a second member's event can arrive while the first one's connect is still initialising the room
+        return await store.load(room) or await init_state(room)
+
+    async def _on_tick(self, room: str):
+        if not await store.claim_ticker(room):
+            return
+        state_ = await store.load(room)
+        if state_ is None or state_.status != "running":
+            # stopped, possibly by another worker; this worker keeps the lease and carries on once restarted
+            return
+        await store.update(room, tick=state_.tick + 1)
+        await self._emit_on_tick(room)
 
-    async def _emit_on_tick(self, sid: str):
-        state_ = state[self.rooms[sid]]
+    async def _emit_on_tick(self, room: str):
         data = schemas.TickPayload(timestamp=datetime.now(tz=timezone.utc).isoformat())
-        await self.emit("tick", data.model_dump(), room=self.rooms[sid])
+        await self.emit("tick", data, room=room)
 
     @socket_publish("tick", payload=schemas.TickPayload)
-    @socket_event("start", response_event="start")
+    @socket_event("start", response_event=field_event("start"))
     async def on_start(self, sid: str):
-        if state[self.rooms[sid]].status == "running":
+        room = self.room_of(sid)
+        state_ = await self._state(room)
+        if state_.status == "running":
             return
-        state[self.rooms[sid]].status = "running"
-        if state[self.rooms[sid]].interval is None:
-            state[self.rooms[sid]].interval = Interval(action=lambda: state[self.rooms[sid]].on_tick(lambda: self._emit_on_tick(sid)),
-                                                       interval=settings.interval)
+        await store.update(room, status="running")
+        await self._sync(room)
 
-    @socket_event("stop", response_event="stop")
+    @socket_event("stop", response_event=field_event("stop"))
     async def on_stop(self, sid: str):
-        if state[self.rooms[sid]].status == "stopped":
+        room = self.room_of(sid)
+        state_ = await self._state(room)
+        if state_.status == "stopped":
             return
 
-        state[self.rooms[sid]].status = "stopped"
-        if state[self.rooms[sid]].interval is not None:
-            state[self.rooms[sid]].interval.cancel()
+        await store.update(room, status="stopped")
+        await self._sync(room)
 
-    @socket_event("reset", response_event="reset")
+    @socket_event("reset", response_event=field_event("reset"))
     async def on_reset(self, sid: str):
-        state[self.rooms[sid]].reset()
+        room = self.room_of(sid)
+        await store.reset(room)
+        await self._sync(room)
 
     @socket_event(
         "text_update",
         payload=schemas.TextUpdatePayload,
         response=schemas.TextUpdatePayload,
-        response_event="text_update",
+        response_event=field_event("text_update"),
+        rate=settings.socket_update_rate,
+        room_rate=settings.socket_update_room_rate,
+        coalesce=settings.socket_coalesce_window or None,
+        trailing=True,
     )
     async def on_text_update(self, sid: str, data: schemas.TextUpdatePayload):
-        state[self.rooms[sid]].text = data.text
+        room = self.room_of(sid)
+        await store.update(room, text=data.text)
+        await self._sync(room)
         return data
 
     @socket_event(
         "arc_width_update",
         payload=schemas.ArcWidthUpdatePayload,
         response=schemas.ArcWidthUpdatePayload,
-        response_event="arc_width_update",
+        response_event=field_event("arc_width_update"),
+        rate=settings.socket_update_rate,
+        room_rate=settings.socket_update_room_rate,
+        coalesce=settings.socket_coalesce_window or None,
+        trailing=True,
     )
     async def on_arc_width_update(
         self, sid: str, data: schemas.ArcWidthUpdatePayload
     ):
-        state[self.rooms[sid]].arc_width = data.arc_width
+        room = self.room_of(sid)
+        await store.update(room, arc_width=data.arc_width)
+        await self._sync(room)
         return data
 
     @socket_event(
         "select_county",
         payload=schemas.SelectCountyPayload,
         response=schemas.SelectCountyBroadcastPayload,
-        response_event="select_county",
+        response_event=field_event("select_county"),
+        rate="5/second",
+        room_rate="10/second",
     )
     async def on_select_county(self, sid: str, data: schemas.SelectCountyPayload):
         broadcast_data = schemas.SelectCountyBroadcastPayload(
             county_id=data.county_id,
             animation_start_time=int(time.time() * 1000),
         )
-        state[self.rooms[sid]].select_county_event = broadcast_data.model_dump()
+        room = self.room_of(sid)
+        await store.update(room, select_county_event=broadcast_data.model_dump())
+        await self._sync(room)
         return broadcast_data
 
 def configure_v1_namespace():
@@ -1,27 +1,20 @@
-import time
+import uuid
 import asyncio
-import threading
-from dataclasses import dataclass
+import collections
+from dataclasses import dataclass, fields
 from datetime import datetime, timezone
-from typing import TypedDict
+from typing import Any, TypedDict
 
+from redis import asyncio as aioredis
 
-class Interval:
-    def __init__(self, action, interval):
-        self.interval = interval
-        self.action = action
-        self.stopEvent = threading.Event()
-        thread = threading.Thread(target=self._set_interval)
-        thread.start()
+from app.core import codec
+from app.core.logger import logger
+from app.core.config import get_settings
+from app.core.cache import create_redis
+from app.core.scheduler import ScheduledTick
 
-    def _set_interval(self):
-        next_time = time.time() + self.interval
-        while not self.stopEvent.wait(next_time - time.time()):
-            next_time += self.interval
-            asyncio.run(self.action())
+settings = get_settings()
 
-    def cancel(self):
-        self.stopEvent.set()
 
 class SelectCountyEvent(TypedDict):
     county_id: str
@@ -29,21 +22,17 @@ class SelectCountyEvent(TypedDict):
 
 @dataclass
 class State:
-    interval: Interval | None = None
+    interval: ScheduledTick | None = None
     status: str = "stopped"
     tick: int = 0
     timestamp: datetime = None
     text: str = ""
     arc_width: float = 1.0
     select_county_event: SelectCountyEvent | None = None
-
-    async def on_tick(self, emitter):
-        self.tick += 1
-        await emitter()
+    version: int = 0
 
     def reset(self):
         self.tick = 0
-        self.interval = None
         self.status = "stopped"
         self.timestamp = datetime.now(tz=timezone.utc)
         self.text = ""
@@ -56,21 +45,313 @@ class State:
             "text": self.text,
             "arc_width": self.arc_width,
             "select_county_event": self.select_county_event,
+            "version": self.version,
         }
 
+    def patch(self, names) -> dict[str, Any]:
+        """The `to_dict` entries of the given synced fields."""
+        full = self.to_dict()
+        return {name: full[name] for name in names if name in SYNCED_FIELDS}
+
+
+# fields shared between workers; the tick interval is each worker's own ticker for the room
+SHARED_FIELDS = tuple(f.name for f in fields(State) if f.name != "interval")
+# fields clients see; only changes to these bump the version and produce patches
+SYNCED_FIELDS = ("status", "timestamp", "text", "arc_width", "select_county_event")
+
+
+class StatePatch(TypedDict):
+    from_version: int
+    to_version: int
+    patch: dict[str, Any]
+
+
+class RoomStateStore:
+    """
+    In-process room state store.
+
+    Handlers read the local copy returned by `get` and write through `update`,
+    so that shared backends can persist the changed fields. `load` refreshes the
+    local copy from the backend before reads that must see other workers' writes.
+
+    Every `update` of a synced field and every `reset` bumps the room's
+    monotonically increasing `version`, which scopes cached responses to the
+    state they were built from. The last `history_size` changes are kept as
+    field-level patches, so that a client that is behind can catch up with
+    `delta` instead of a full snapshot.
+    """
+
+    def __init__(self, history_size: int = 64):
+        self._local: dict[str, State] = {}
+        self.history_size = history_size
+        self._history: dict[str, collections.deque[StatePatch]] = {}
+
+    def get(self, room: str) -> State | None:
+        return self._local.get(room)
+
+    async def init(self, room: str) -> State:
+        if room not in self._local:
+            self._local[room] = State(timestamp=datetime.now(tz=timezone.utc))
+        return self._local[room]
+
+    async def load(self, room: str) -> State | None:
+        return self._local.get(room)
+
+    async def version(self, room: str) -> int:
+        state_ = self._local.get(room)
+        return state_.version if state_ is not None else 0
+
+    async def update(self, room: str, **changes: Any) -> State:
+        # an event can arrive while its room's first connect is still initialising it
+        state_ = self._local.get(room) or await self.init(room)
+        for name, value in changes.items():
+            setattr(state_, name, value)
+        await self._commit(room, state_, changes, state_.patch(changes))
+        return state_
+
+    async def reset(self, room: str) -> State:
+        state_ = self._local.get(room) or await self.init(room)
+        state_.reset()
+        await self._commit(room, state_, {name: getattr(state_, name) for name in SHARED_FIELDS},
+                           state_.patch(SYNCED_FIELDS))
+        return state_
+
+    async def claim_ticker(self, room: str) -> bool:
+        """Whether this worker runs the room's tick; every worker with members asks, and only one is told yes."""
+        return room in self._local
+
+    async def clear(self, room: str):
+        state_ = self._local.pop(room, None)
+        self._history.pop(room, None)
+        if state_ is not None and state_.interval is not None:
+            state_.interval.cancel()
+
+    def last_patch(self, room: str) -> StatePatch | None:
+        history = self._history.get(room)
+        return history[-1] if history else None
+
+    async def delta(self, room: str, since: int) -> StatePatch | None:
+        """
+        The changes from version `since` to the current one, merged into one
+        patch, or None when they are no longer (or were never) all in the history.
+        """
+        state_ = await self.load(room)
+        if state_ is None:
+            return None
+        if since == state_.version:
+            return StatePatch(from_version=since, to_version=since, patch={})
+        merged: dict[str, Any] = {}
+        version = since
+        for entry in self._history.get(room, ()):
+            if entry["from_version"] == version:
+                merged.update(entry["patch"])
+                version = entry["to_version"]
+            elif version != since:
+                # a gap after the chain started, e.g. a write made by another worker
+                return None
+        if version == since or version != state_.version:
+            return None
+        return StatePatch(from_version=since, to_version=version, patch=merged)
+
+    def _record(self, room: str, version: int, patch: dict[str, Any]):
+        history = self._history.get(room)
+        if history is None:
+            history = self._history[room] = collections.deque(maxlen=self.history_size)
+        history.append(StatePatch(from_version=version - 1, to_version=version, patch=patch))
+
+    async def _commit(self, room: str, state_: State, changes: dict[str, Any], patch: dict[str, Any]):
+        """Store the changed fields and, if any of them are synced, take the next version for the patch."""
+        if patch:
+            state_.version += 1
+            self._record(room, state_.version, patch)
+
+
+class RedisRoomStateStore(RoomStateStore):
+    """
+    Room state shared between workers through one Redis hash per room.
+
+    Changes to synced fields are written through at once, in a transaction
+    that stores them and takes the room's next version with `HINCRBY`, so
+    every patch carries the version Redis assigned to it. Other writes (the
+    tick counter) go to the local copy immediately and are batched into a
+    single pipelined `HSET` per room every `flush_interval` seconds. Each
+    worker registers itself in a per-room set so that the hash is only deleted
+    once the last worker with members in the room clears it.
+
+    The worker holding a room's ticker lease, taken with `SET NX PX` and
+    renewed on every tick, is the only one that ticks. Clearing the room
+    hands the lease back, so that another worker with members takes over on
+    its next tick; a worker that dies loses it after `ticker_lease` seconds.
+    """
+
+    # leaves the room's worker set, handing back the ticker lease if this worker holds it, and, if it was the last
+    # one, deletes the room in the same step, so that a concurrent `init` on another worker either registers before
+    # the check or recreates the hash after it
+    RELEASE_SCRIPT = """
+    redis.call('SREM', KEYS[2], ARGV[1])
+    if redis.call('GET', KEYS[3]) == ARGV[1] then
+        redis.call('DEL', KEYS[3])
+    end
+    if redis.call('SCARD', KEYS[2]) == 0 then
+        redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+        return 1
+    end
+    return 0
+    """
+
+    # renews the ticker lease if this worker holds it, or takes it if nobody does
+    CLAIM_SCRIPT = """
+    local owner = redis.call('GET', KEYS[1])
+    if owner == ARGV[1] then
+        redis.call('PEXPIRE', KEYS[1], ARGV[2])
+        return 1
+    end
+    if not owner then
+        redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(self, redis: aioredis.Redis, prefix: str, flush_interval: float = 0.05, history_size: int = 64,
+                 ticker_lease: float = 90):
+        super().__init__(history_size)
+        self.redis = redis
+        self._release = redis.register_script(self.RELEASE_SCRIPT)
+        self._claim = redis.register_script(self.CLAIM_SCRIPT)
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self.ticker_lease = ticker_lease
+        self.worker_id = uuid.uuid4().hex
+        self._pending: dict[str, dict[str, bytes]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None
+
+    def _key(self, room: str) -> str:
+        return f"{self.prefix}:{room}"
+
+    @staticmethod
+    def _encode(name: str, value: Any) -> bytes:
+        if name == "timestamp" and value is not None:
+            value = value.isoformat()
+        return codec.dumps(value)
+
+    @staticmethod
+    def _decode(name: str, raw: bytes | str) -> Any:
+        value = codec.loads(raw)
+        if name == "timestamp" and value is not None:
+            value = datetime.fromisoformat(value)
+        return value
+
+    def _apply(self, state_: State, raw: dict[bytes | str, bytes | str]):
+        for key, value in raw.items():
+            name = key.decode() if isinstance(key, bytes) else key
+            if name in SHARED_FIELDS:
+                setattr(state_, name, self._decode(name, value))
+
+    async def init(self, room: str) -> State:
+        if room in self._local:
+            return self._local[room]
+        state_ = State(timestamp=datetime.now(tz=timezone.utc))
+        key = self._key(room)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for name in SHARED_FIELDS:
+                pipe.hsetnx(key, name, self._encode(name, getattr(state_, name)))
+            pipe.sadd(f"{key}:workers", self.worker_id)
+            pipe.hgetall(key)
+            *_, raw = await pipe.execute()
+        self._apply(state_, raw)
+        # another connect to the same room may have finished first
+        return self._local.setdefault(room, state_)
+
+    async def load(self, room: str) -> State | None:
+        state_ = self._local.get(room)
+        if state_ is None:
+            return None
+        raw = await self.redis.hgetall(self._key(room))
+        # fields written here but not flushed yet are newer than what Redis has
+        pending = self._pending.get(room, {})
+        self._apply(state_, {k: v for k, v in raw.items()
+                             if (k.decode() if isinstance(k, bytes) else k) not in pending})
+        return state_
+
+    async def version(self, room: str) -> int:
+        if room not in self._local:
+            return 0
+        version = await self.redis.hget(self._key(room), "version")
+        return int(version or 0)
+
+    async def claim_ticker(self, room: str) -> bool:
+        if room not in self._local:
+            return False
+        return bool(await self._claim(keys=[f"{self._key(room)}:ticker"],
+                                      args=[self.worker_id, int(self.ticker_lease * 1000)]))
+
+    async def clear(self, room: str):
+        await super().clear(room)
+        if room in self._pending:
+            await self.flush()
+        key = self._key(room)
+        await self._release(keys=[key, f"{key}:workers", f"{key}:ticker"], args=[self.worker_id])
+
+    async def _commit(self, room: str, state_: State, changes: dict[str, Any], patch: dict[str, Any]):
+        fields = {name: self._encode(name, value) for name, value in changes.items()
+                  if name in SHARED_FIELDS and name != "version"}
+        if not patch:
+            self._pending.setdefault(room, {}).update(fields)
+            if self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self._start_flush)
+            return
+        # batched fields of the room go out first, so that a later flush cannot overwrite these
+        fields = self._pending.pop(room, {}) | fields
+        key = self._key(room)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.hincrby(key, "version", 1)
+            _, version = await pipe.execute()
+        # writes of this worker may complete out of order; the version never goes back
+        state_.version = max(state_.version, version)
+        self._record(room, version, patch)
+
+    def _start_flush(self):
+        self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        pending = {room: mapping for room, mapping in pending.items() if mapping}
+        if not pending:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for room, mapping in pending.items():
+                    pipe.hset(self._key(room), mapping=mapping)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to flush room state: {e!r}")
+            # keep the fields for the next flush unless they were overwritten meanwhile
+            for room, mapping in pending.items():
+                self._pending[room] = mapping | self._pending.get(room, {})
+
+
+def create_store() -> RoomStateStore:
+    if settings.state_backend == "redis":
+        return RedisRoomStateStore(create_redis(), prefix=f"{settings.cache_prefix}:rooms",
+                                   flush_interval=settings.state_flush_interval,
+                                   history_size=settings.state_history_size,
+                                   # renewed every tick, so it only runs out if its holder stops ticking
+                                   ticker_lease=settings.interval * 3)
+    return RoomStateStore(history_size=settings.state_history_size)
+
 
-state: dict[str, State] = {}
+store = create_store()
 
 
-def init_state(room: str):
-    global state
-    if room in state:
-        return
-    state[room] = State(timestamp=datetime.now(tz=timezone.utc))
+async def init_state(room: str) -> State:
+    return await store.init(room)
 
 
-def clear_state(room: str):
-    global state
-    if room not in state:
-        return
-    del state[room]
\ No newline at end of file
+async def clear_state(room: str):
+    await store.clear(room)
@@ -1,21 +1,36 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 
-from app.core.config import get_settings
+from app.core.config import APP_TITLE, APP_VERSION, get_settings
 from app.core.cache import configure_cache
+from app.db.session import engine, prewarm
+from app.core.api_keys import api_keys
+from app.core.scheduler import LoopLagMonitor
 
 settings = get_settings()
 
+loop_lag = LoopLagMonitor(settings.event_loop_lag_interval)
+
 
 @asynccontextmanager
 async def lifespan(_application: FastAPI):
     if settings.cache_enabled:
         await configure_cache()
+    await prewarm(settings.db_prewarm)
+    if not settings.disable_auth:
+        await api_keys.start()
+    if settings.event_loop_lag_interval > 0:
+        loop_lag.start()
     yield
+    loop_lag.stop()
+    api_keys.stop()
+    # pooled aiosqlite connections run on threads that would otherwise keep the process alive
+    await engine.dispose()
 
 app = FastAPI(
     lifespan=lifespan,
     root_path=settings.base_path,
-    title="zrsa-ove-demo Observatory Demo",
+    title=APP_TITLE,
+    version=APP_VERSION,
     description="Demo for Imperial College London's Data Observatory showcasing the zrsa-ove-demo project."
 )
\ No newline at end of file
@@ -0,0 +1,152 @@
+import math
+import time
+import hashlib
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from prometheus_client import Counter
+
+from app.db.models import APIKey
+from app.core.logger import logger
+from app.db.session import session_factory
+from app.core.config import get_settings
+from app.core.scheduler import ScheduledTick, scheduler
+
+settings = get_settings()
+
+api_key_lookups = Counter("api_key_lookups_total", "API key verifications by how they were answered", ["result"])
+api_key_hits = api_key_lookups.labels(result="hit")
+api_key_negative_hits = api_key_lookups.labels(result="negative_hit")
+api_key_filtered = api_key_lookups.labels(result="filtered")
+api_key_misses = api_key_lookups.labels(result="miss")
+
+
+def _digest(key: str) -> bytes:
+    # keys are only ever held as hashes
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+class BloomFilter:
+    """A Bloom filter over SHA-256 digests, sized for `capacity` items at `error_rate` false positives."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: bytes):
+        # double hashing on two halves of the digest
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, digest: bytes):
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class APIKeyVerifier:
+    """
+    Verifies API keys against `api_keys` with a TTL cache in front of the database.
+
+    Known keys are cached for `ttl` seconds and unknown ones for `negative_ttl`
+    seconds, in an LRU bounded by `max_negative` so that random keys cannot
+    exhaust memory. A Bloom filter of every key, loaded by `refresh`, rejects
+    most unknown keys before they reach the database. Inserting, updating or
+    deleting an APIKey through the ORM drops both caches and the filter; a
+    `refresh` that finds the table changed by anyone else does the same.
+    """
+
+    def __init__(self, ttl: int, negative_ttl: int, max_negative: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_negative = max_negative
+        self._known: dict[bytes, float] = {}
+        self._unknown: OrderedDict[bytes, float] = OrderedDict()
+        self._bloom: BloomFilter | None = None
+        self._fingerprint: bytes | None = None
+        self._generation = 0
+        self._refresh: ScheduledTick | None = None
+
+    def invalidate(self):
+        self._known.clear()
+        self._unknown.clear()
+        # until the next refresh every unknown key goes to the database
+        self._bloom = None
+        self._fingerprint = None
+        self._generation += 1
+
+    async def verify(self, key: str) -> bool:
+        digest = _digest(key)
+        now = time.monotonic()
+        expiry = self._known.get(digest)
+        if expiry is not None and expiry > now:
+            api_key_hits.inc()
+            return True
+        expiry = self._unknown.get(digest)
+        if expiry is not None and expiry > now:
+            api_key_negative_hits.inc()
+            return False
+        if self._bloom is not None and digest not in self._bloom:
+            api_key_filtered.inc()
+            self._remember(digest, False, now)
+            return False
+
+        api_key_misses.inc()
+        generation = self._generation
+        async with session_factory() as db:
+            found = await db.get(APIKey, key) is not None
+        if generation == self._generation:
+            self._remember(digest, found, time.monotonic())
+        return found
+
+    def _remember(self, digest: bytes, found: bool, now: float):
+        if found:
+            self._known[digest] = now + self.ttl
+            return
+        self._unknown[digest] = now + self.negative_ttl
+        self._unknown.move_to_end(digest)
+        if len(self._unknown) > self.max_negative:
+            self._unknown.popitem(last=False)
+
+    async def refresh(self):
+        """(Re)load the Bloom filter from `api_keys`, dropping the caches if the keys changed."""
+        generation = self._generation
+        async with session_factory() as db:
+            digests = sorted(_digest(key) for key in (await db.scalars(select(APIKey.id))).all())
+        fingerprint = hashlib.sha256(b"".join(digests)).digest()
+        if generation != self._generation:
+            # invalidated while loading; the next refresh picks the change up
+            return
+        if self._fingerprint is not None and fingerprint != self._fingerprint:
+            self.invalidate()
+        bloom = BloomFilter(len(digests))
+        for digest in digests:
+            bloom.add(digest)
+        self._bloom = bloom
+        self._fingerprint = fingerprint
+
+    async def _refresh_safely(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"Failed to refresh API keys: {e!r}")
+
+    async def start(self):
+        await self._refresh_safely()
+        self._refresh = scheduler.schedule(self._refresh_safely, interval=settings.api_key_refresh_interval)
+
+    def stop(self):
+        if self._refresh is not None:
+            self._refresh.cancel()
+            self._refresh = None
+
+
+api_keys = APIKeyVerifier(ttl=settings.api_key_cache_ttl, negative_ttl=settings.api_key_negative_ttl)
+
+for _change in ("after_insert", "after_update", "after_delete"):
+    event.listen(APIKey, _change, lambda *_args: api_keys.invalidate())
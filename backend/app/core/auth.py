@@ -1,20 +1,16 @@
-import functools
-from uuid import uuid4
 from typing import Annotated
-from http.cookies import SimpleCookie
 
 from pydantic import BaseModel
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, Response
 from fastapi import Depends, HTTPException, status, Query
 from fastapi.security import APIKeyCookie, APIKeyQuery, HTTPAuthorizationCredentials, HTTPBearer, HTTPBasic, \
     HTTPBasicCredentials
 
 from app.app import app
-from app.db.models import APIKey
-from app.core.state import state
+from app.core.state import sessions
+from app.core.api_keys import api_keys
 from app.core.logger import logger
 from app.core.config import get_settings
-from app.db.session import get_db, AsyncSession
 
 settings = get_settings()
 
@@ -37,23 +33,21 @@ def metrics_scheme(user: HTTPBasicCredentials = Depends(basic_scheme)):
         )
 
 
-def cookie_scheme(cookie: str = Depends(base_cookie_scheme)):
-    if cookie not in state.cookies:
+async def cookie_scheme(cookie: str = Depends(base_cookie_scheme)):
+    if not await sessions.validate_session(cookie):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
         )
 
 
-def otp_scheme(token: str = Depends(query_scheme)):
+async def otp_scheme(token: str = Depends(query_scheme)):
     if settings.use_legacy_auth and token != settings.legacy_auth_key:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"Invalid token: {token}",
         )
     elif not settings.use_legacy_auth:
-        if token in state.tokens:
-            state.tokens.remove(token)
-        else:
+        if not await sessions.consume_otp(token):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Invalid token: {token}",
@@ -61,70 +55,41 @@ def otp_scheme(token: str = Depends(query_scheme)):
     return token
 
 
-def _get_token_from_environ(environ: dict) -> str | None:
-    # ASGIApp passes the scope in environ under "asgi.scope"
-    scope = environ.get("asgi.scope", {})
-    headers = scope.get("headers", [])
-    cookie_header = next(
-        (v.decode() for k, v in headers if k == b"cookie"), ""
-    )
-    cookie = SimpleCookie()
-    cookie.load(cookie_header)
-    morsel = cookie.get("session")
-    return morsel.value if morsel else None
-
-
-async def authenticate(environ):
-    token = _get_token_from_environ(environ)
-    if not token:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
-
-
-def socket_auth(func):
-    @functools.wraps(func)
-    async def wrapper(self, sid, environ, *args, **kwargs):
-        # await the original authenticate
-        if settings.disable_auth:
-            auth = None
-        else:
-            auth = await authenticate(environ)
-        # call the underlying method, injecting `auth`
-        return await func(self, sid, environ, auth, *args, **kwargs)
-
-    return wrapper
-
-
 @app.get("/auth/validate", response_model=bool)
 def validate_token(_cookie: str = Depends(cookie_scheme)):
     return True
 
 
 @app.get("/auth/redirect")
-def redirect(options: Annotated[RedirectOptions, Query()], _token: str = Depends(otp_scheme)):
+async def redirect(options: Annotated[RedirectOptions, Query()], _token: str = Depends(otp_scheme)):
     response = RedirectResponse(
         url=options.to,
     )
 
-    token = uuid4().hex
-    state.cookies.add(token)
+    token = await sessions.create_session(settings.token_expiry)
     response.set_cookie("session", token, httponly=True, samesite="lax", secure=True, max_age=settings.token_expiry)
 
     return response
 
 
+@app.post("/auth/logout")
+async def logout(cookie: str = Depends(base_cookie_scheme)):
+    await sessions.revoke_session(cookie)
+    response = Response(status_code=status.HTTP_204_NO_CONTENT)
+    response.delete_cookie("session", httponly=True, samesite="lax", secure=True)
+    return response
+
+
 @app.get("/auth/token")
-async def get_token(credentials: Annotated[HTTPAuthorizationCredentials, Depends(api_key_scheme)],
-                    db: AsyncSession = Depends(get_db)):
+async def get_token(credentials: Annotated[HTTPAuthorizationCredentials, Depends(api_key_scheme)]):
     if settings.disable_auth:
         return "DISABLED"
-    if await db.get(APIKey, credentials.credentials) is None:
+    if not await api_keys.verify(credentials.credentials):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
         )
 
-    token = uuid4().hex
-    state.tokens.add(token)
-    return token
+    return await sessions.issue_otp(settings.otp_expiry)
 
 
 def override_metrics_schema():
@@ -1,31 +1,126 @@
-import json
-from typing import Any, Callable, Optional, TypeVar, Union
+import math
+import random
+import asyncio
+from typing import Any, Callable, Optional, Tuple, TypeVar, Union
 
 from fastapi_cache import FastAPICache
 from fastapi_cache.decorator import cache
 from fastapi_cache.coder import Coder
+from fastapi_cache.types import Backend
 from fastapi_cache.backends.redis import RedisBackend
-from fastapi.encoders import jsonable_encoder
+from prometheus_client import Counter
 from redis import asyncio as aioredis
 
+from app.core import codec
 from app.core.config import get_settings
 from app.core.logger import logger
 
 settings = get_settings()
 
+cache_lookups = Counter("cache_lookups_total", "Cache lookups by outcome", ["result"])
+cache_hits = cache_lookups.labels(result="hit")
+cache_misses = cache_lookups.labels(result="miss")
+cache_coalesced = cache_lookups.labels(result="coalesced")
+cache_stale = cache_lookups.labels(result="stale")
+
 
 class CustomJsonCoder(Coder):
     @classmethod
     def encode(cls, value: Any) -> bytes:
-        return json.dumps(jsonable_encoder(value)).encode("utf-8")
+        return codec.dumps(value)
 
     @classmethod
     def decode(cls, value: bytes) -> Any:
-        return json.loads(value.decode("utf-8"))
+        return codec.loads(value)
 
 
-async def configure_cache():
-    redis = await aioredis.Redis(
+class CoalescingBackend(Backend):
+    """
+    Wraps a fastapi-cache backend with request coalescing and stale-while-revalidate.
+
+    The first caller to miss a key becomes its leader and computes the value;
+    concurrent callers missing the same key wait for the leader's `set` instead
+    of computing it again. With `stale_ttl`, entries are kept for that many
+    seconds past their expiry: the first caller after expiry refreshes the entry
+    while everyone else is served the stale value. Expiries are spread by up to
+    `jitter` (a fraction of the TTL, rounded up to whole seconds) so that keys
+    written together do not expire together. A leader loses the key when its
+    task finishes without a `set`, e.g. because the handler raised, or after
+    `lease` seconds at the latest; the next waiter then takes over.
+    """
+
+    def __init__(self, backend: Backend, stale_ttl: int = 0, jitter: float = 0.0, lease: float = 5.0):
+        self.backend = backend
+        self.stale_ttl = stale_ttl
+        self.jitter = jitter
+        self.lease = lease
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _lead(self, key: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[key] = future
+        loop.call_later(self.lease, self._release, key, future)
+        task = asyncio.current_task()
+        if task is not None:
+            # fastapi-cache only calls `set` on success; a request that ends without it gives the key up
+            task.add_done_callback(lambda _: self._release(key, future))
+
+    def _release(self, key: str, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.cancel()
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        ttl, value = await self.backend.get_with_ttl(key)
+        if value is not None:
+            if ttl < 0 or ttl > self.stale_ttl:
+                cache_hits.inc()
+                return ttl - self.stale_ttl if ttl >= 0 else ttl, value
+            if key in self._inflight:
+                cache_stale.inc()
+                return 0, value
+            # past its expiry: this caller refreshes the entry
+            self._lead(key)
+            cache_misses.inc()
+            return 0, None
+
+        while (future := self._inflight.get(key)) is not None:
+            try:
+                ttl, value = await asyncio.shield(future)
+                cache_coalesced.inc()
+                return ttl, value
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            # the leader gave up: the first waiter to wake leads in its place
+        self._lead(key)
+        cache_misses.inc()
+        return 0, None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_with_ttl(key))[1]
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        ttl = expire
+        if expire:
+            # whole seconds, so that short TTLs are spread too
+            ttl = expire + random.randint(0, math.ceil(expire * self.jitter)) + self.stale_ttl
+        try:
+            await self.backend.set(key, value, ttl)
+        finally:
+            future = self._inflight.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result((expire or -1, value))
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await self.backend.clear(namespace, key)
+
+
+def create_redis() -> aioredis.Redis:
+    """Create a client for the Redis server configured by the CACHE_* settings."""
+    return aioredis.Redis(
         host=settings.cache_host,
         port=settings.cache_port,
         password=settings.cache_password,
@@ -35,8 +130,14 @@ async def configure_cache():
         ssl_cert_reqs="required",
         ssl_ca_certs=settings.ca_bundle_path
     )
+
+
+async def configure_cache():
+    redis = create_redis()
     await redis.ping()
-    FastAPICache.init(RedisBackend(redis), prefix=settings.cache_prefix)
+    backend = CoalescingBackend(RedisBackend(redis), stale_ttl=settings.cache_stale_ttl,
+                                jitter=settings.cache_ttl_jitter, lease=settings.cache_coalesce_timeout)
+    FastAPICache.init(backend, prefix=settings.cache_prefix)
     logger.info("Cache configured")
 
 
@@ -54,6 +155,8 @@ def cached(
       - uses CustomJsonCoder
       - defaults to settings.cache_expiration
       - is disabled when settings.cache_enabled is False
+      - coalesces concurrent misses and serves stale entries while they are
+        refreshed (see CoalescingBackend)
     Usage:
       @cached
       async def route1(...): ...
@@ -0,0 +1,78 @@
+import json
+from typing import Any
+
+import pydantic_core
+from pydantic import BaseModel
+from fastapi.encoders import jsonable_encoder
+
+from app.core.logger import logger
+from app.core.config import get_settings
+
+try:
+    import orjson
+except ImportError:  # optional, selected with JSON_CODEC=orjson
+    orjson = None
+
+settings = get_settings()
+
+
+def to_builtins(value: Any) -> Any:
+    """Convert a value an encoder cannot handle (models, datetimes, ...) to plain JSON types."""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return jsonable_encoder(value)
+
+
+def _pydantic_dumps(value: Any) -> bytes:
+    # serialises models (and anything nested in them) straight to bytes in pydantic-core
+    return pydantic_core.to_json(value, by_alias=False, fallback=jsonable_encoder)
+
+
+def _orjson_dumps(value: Any) -> bytes:
+    if isinstance(value, BaseModel):
+        return _pydantic_dumps(value)
+    return orjson.dumps(value, default=to_builtins, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _stdlib_dumps(value: Any) -> bytes:
+    return json.dumps(value, default=to_builtins, separators=(",", ":")).encode("utf-8")
+
+
+def _stdlib_loads(data: bytes | str) -> Any:
+    return json.loads(data)
+
+
+_codecs = {
+    "pydantic": (_pydantic_dumps, pydantic_core.from_json),
+    "orjson": (_orjson_dumps, orjson.loads if orjson is not None else None),
+    "json": (_stdlib_dumps, _stdlib_loads),
+}
+
+codec_name = settings.json_codec
+if codec_name not in _codecs:
+    raise ValueError(f"Unsupported JSON codec: {codec_name}")
+if codec_name == "orjson" and orjson is None:
+    logger.warn("JSON_CODEC=orjson but orjson is not installed, falling back to pydantic")
+    codec_name = "pydantic"
+
+# dumps(value) -> bytes handles pydantic models; loads accepts bytes or str
+dumps, loads = _codecs[codec_name]
+
+
+def canonical(value: Any) -> bytes:
+    """A stable encoding of a value for hashing into cache keys."""
+    if isinstance(value, BaseModel):
+        return _pydantic_dumps(value)
+    return json.dumps(value, default=to_builtins, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+class SocketJson:
+    """The `json` module interface python-socketio and python-engineio expect, backed by the codec."""
+
+    @staticmethod
+    def dumps(value: Any, *_args, **_kwargs) -> str:
+        return dumps(value).decode("utf-8")
+
+    @staticmethod
+    def loads(data: bytes | str, *_args, **_kwargs) -> Any:
+        return loads(data)
@@ -2,6 +2,9 @@ from functools import lru_cache
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+APP_TITLE = "zrsa-ove-demo Observatory Demo"
+APP_VERSION = "0.1.0"
+
 
 class Settings(BaseSettings):
     app_name: str = "zrsa-ove-demo"
@@ -13,6 +16,12 @@ class Settings(BaseSettings):
     cache_prefix: str = "zrsa-ove-demo"
     cache_expiration: int | None = None
     cache_enabled: bool = True
+    socket_cache_expiration: int | None = 300
+    cache_stale_ttl: int = 0
+    cache_ttl_jitter: float = 0.1
+    cache_coalesce_timeout: float = 5.0
+
+    json_codec: str = "pydantic"
     cache_password: str | None = None
     secure_cache: bool = False
 
@@ -23,6 +32,16 @@ class Settings(BaseSettings):
     websocket_origin: str = "ws://localhost:5173"
 
     database_url: str = None
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1
+    db_pool_pre_ping: bool = False
+    db_prewarm: int = 5
+    db_sqlite_journal_mode: str = "WAL"
+    db_sqlite_synchronous: str = "NORMAL"
+    db_sqlite_busy_timeout: int = 5000
+    db_sqlite_mmap_size: int = 268435456
     config_dir: str = "config"
     public_dir: str = "public"
     models_dir: str = "models"
@@ -37,14 +56,45 @@ class Settings(BaseSettings):
     protect_metrics: bool = True
     metrics_username: str = None
     metrics_password: str = None
+    metrics_cache_ttl: float = 1.0
+    metrics_compact_dead_workers: bool = True
+    event_loop_lag_interval: float = 0.5
     token_expiry: int = 3600
+    api_key_cache_ttl: int = 60
+    api_key_negative_ttl: int = 30
+    api_key_refresh_interval: int = 300
+    otp_expiry: int = 300
+    session_backend: str = "memory"
+    signed_sessions: bool = False
+    session_secret: str | None = None
 
     port: int = 8000
 
     log_level: int = -1
+    log_format: str = "pretty"
     logging_server: str | None = None
+    logging_queue_size: int = 10000
+    logging_batch_size: int = 100
+    logging_flush_interval: float = 1.0
+    logging_max_backoff: float = 30.0
 
     interval: int = 30
+    state_backend: str = "memory"
+    state_flush_interval: float = 0.05
+    state_history_size: int = 64
+    state_sync: str = "events"
+
+    socket_manager: str = "local"
+    socket_manager_url: str | None = None
+    socket_manager_channel: str | None = None
+    socket_manager_queue_size: int = 1000
+    socket_rate_limit_backend: str = "memory"
+    socket_rate_limit_max_keys: int = 100000
+    socket_coalesce_window: float = 0
+    socket_update_rate: str = "60/second"
+    socket_update_room_rate: str = "120/second"
+    socket_phase_timing: bool = False
+    socket_serializer: str = "json"
 
     vite_backend: str = None
     vite_socket_server: str = None
@@ -1,9 +1,19 @@
 import re
 import sys
+import json
+import copy
+import time
+import queue
+import atexit
 import logging
 import datetime
+import threading
+import collections
+import logging.handlers
 import urllib.request
 
+from prometheus_client import Counter
+
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -66,6 +76,11 @@ LogLevels = {
 TRACE_LEVEL_NUM = 5
 logging.addLevelName(TRACE_LEVEL_NUM, "TRACE")
 
+shipped_batches = Counter("log_shipping_batches_total", "Batches of log lines POSTed to the logging server",
+                          ["outcome"])
+dropped_lines = Counter("log_shipping_dropped_total",
+                        "Log lines dropped because the logging server could not keep up")
+
 
 def hex_to_rgb(hexstr):
     hexstr = hexstr.lstrip("#")
@@ -94,33 +109,241 @@ class MinLevelFilter(logging.Filter):
         return record.levelno >= self.level
 
 
+class LogShipper:
+    """
+    Ships log lines to the logging server from a background thread.
+
+    Lines are buffered in a bounded queue and POSTed newline-separated, once
+    `batch_size` lines are waiting or every `flush_interval` seconds. When the
+    queue is full the oldest line is dropped. A failed batch is retried with
+    exponential backoff, up to `max_backoff` seconds between attempts.
+    `ship` never waits on the network.
+    """
+
+    def __init__(self, url: str, queue_size: int, batch_size: int, flush_interval: float, max_backoff: float,
+                 timeout: float = 2):
+        self.url = url
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._queue: collections.deque[str] = collections.deque()
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._closed = False
+
+    def ship(self, line: str):
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) >= self.queue_size:
+                self._queue.popleft()
+                dropped_lines.inc()
+            self._queue.append(line)
+            if self._thread is None:
+                # started lazily, so that no shipper thread runs until there is something to send
+                self._thread = threading.Thread(target=self._run, name="log-shipper", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+
+    def close(self, timeout: float = 2):
+        """Send what is still queued, giving up after `timeout` seconds."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _batch_ready(self) -> bool:
+        return self._closed or len(self._queue) >= self.batch_size
+
+    def _run(self):
+        batch: list[str] = []
+        backoff = 0.0
+        while True:
+            with self._cond:
+                if not batch:
+                    self._cond.wait_for(self._batch_ready, timeout=self.flush_interval)
+                    if not self._queue:
+                        if self._closed:
+                            return
+                        continue
+                    batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+                elif backoff:
+                    self._cond.wait_for(lambda: self._closed, timeout=backoff)
+            if self._post(batch):
+                batch, backoff = [], 0.0
+            elif self._closed:
+                dropped_lines.inc(len(batch) + len(self._queue))
+                return
+            else:
+                backoff = min(max(backoff * 2, self.flush_interval), self.max_backoff)
+
+    def _post(self, batch: list[str]) -> bool:
+        req = urllib.request.Request(self.url, data="\n".join(batch).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "text/plain; charset=utf-8"})
+        try:
+            # errors are not logged, as that would feed them back into the queue
+            with urllib.request.urlopen(req, timeout=self.timeout):
+                pass
+        except Exception:
+            shipped_batches.labels(outcome="failed").inc()
+            return False
+        shipped_batches.labels(outcome="sent").inc()
+        return True
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Formats records as `[LEVEL] timestamp - app name : message`, with precomputed ANSI labels."""
+
+    def __init__(self, labels: dict[int, str]):
+        super().__init__()
+        self.labels = labels
+        self.padded_name = settings.app_name.ljust(APP_LOG_ID_WIDTH) + ":"
+        self._second = None
+        self._timestamp = ""
+
+    def format(self, record):
+        second = int(record.created)
+        if second != self._second:
+            # records arrive in order, so the timestamp only changes once a second
+            self._second = second
+            self._timestamp = time.strftime("%d/%m/%Y, %H:%M:%S", time.localtime(second))
+        return f"{self.labels[record.levelno]} {self._timestamp} - {self.padded_name} {record.getMessage()}"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, for machine ingestion."""
+
+    def __init__(self, names: dict[int, str]):
+        super().__init__()
+        self.names = names
+
+    def format(self, record):
+        return json.dumps({
+            "timestamp": datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(),
+            "level": self.names[record.levelno],
+            "app": settings.app_name,
+            "message": record.getMessage(),
+        }, default=str)
+
+
+class ShipperHandler(logging.Handler):
+    """Hands formatted records to a `LogShipper`."""
+
+    def __init__(self, shipper: LogShipper):
+        super().__init__()
+        self.shipper = shipper
+
+    def emit(self, record):
+        try:
+            self.shipper.ship(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records with their message merged but otherwise unformatted, so
+    that only the formatting and the I/O happen on the listener thread.
+    """
+
+    def prepare(self, record):
+        if record.args:
+            # merged on the caller's thread, while the arguments still hold the values that were logged
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+def _noop(*_args):
+    pass
+
+
 class Logger:
-    def __init__(self):
+    """
+    JS-style levelled logger.
+
+    Calls below the threshold are no-ops bound in place of the level's method.
+    Enabled calls join their arguments into the message and queue the record;
+    it is formatted and written to stdout/stderr (and the logging server) by a
+    `QueueListener` thread, which is started when the logger is created.
+    LOG_FORMAT selects `pretty` (ANSI labels) or `json` (JSON lines) output.
+    """
+
+    def __init__(self, name: str | None = None, stdout=None, stderr=None):
         # Underlying Python logger
-        self.logger = logging.getLogger(settings.app_name)
+        self.logger = logging.getLogger(name or settings.app_name)
+        self.levels = {key: self._map_to_python_level(lvl["name"]) for key, lvl in LogLevels.items()}
+        self.shipper = LogShipper(
+            settings.logging_server,
+            queue_size=settings.logging_queue_size,
+            batch_size=settings.logging_batch_size,
+            flush_interval=settings.logging_flush_interval,
+            max_backoff=settings.logging_max_backoff,
+        ) if settings.logging_server else None
+        self.listener: logging.handlers.QueueListener | None = None
         # Avoid duplicate handlers if already configured
         if not self.logger.handlers:
-            self._configure_handlers()
+            self._configure_handlers(stdout or sys.stdout, stderr or sys.stderr)
 
         # Always let us emit everything; we filter manually
         self.logger.setLevel(TRACE_LEVEL_NUM)
+        self.set_level(settings.log_level)
 
-    def _configure_handlers(self):
-        fmt = logging.Formatter("%(message)s")
+    def _configure_handlers(self, stdout, stderr):
+        if settings.log_format == "json":
+            fmt = JsonLinesFormatter({self.levels[key]: lvl["name"] for key, lvl in LogLevels.items()})
+        elif settings.log_format == "pretty":
+            fmt = ConsoleFormatter({self.levels[key]: self._build_label(lvl) for key, lvl in LogLevels.items()})
+        else:
+            raise ValueError(f"Unsupported log format: {settings.log_format}")
 
         # stdout handler for TRACE → INFO
-        h_out = logging.StreamHandler(sys.stdout)
+        h_out = logging.StreamHandler(stdout)
         h_out.setLevel(TRACE_LEVEL_NUM)
         h_out.addFilter(MaxLevelFilter(logging.INFO))
         h_out.setFormatter(fmt)
-        self.logger.addHandler(h_out)
 
         # stderr handler for WARNING → CRITICAL
-        h_err = logging.StreamHandler(sys.stderr)
+        h_err = logging.StreamHandler(stderr)
         h_err.setLevel(logging.WARNING)
         h_err.addFilter(MinLevelFilter(logging.WARNING))
         h_err.setFormatter(fmt)
-        self.logger.addHandler(h_err)
+
+        handlers = [h_out, h_err]
+        if self.shipper is not None:
+            h_ship = ShipperHandler(self.shipper)
+            h_ship.setFormatter(fmt)
+            handlers.append(h_ship)
+
+        # the caller only enqueues; the listener thread formats and writes
+        records = queue.SimpleQueue()
+        self.logger.addHandler(DeferredQueueHandler(records))
+        self.listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def close(self):
+        """Write out every queued record, then flush the logging server."""
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+        if self.shipper is not None:
+            self.shipper.close()
+
+    def set_level(self, level: int):
+        """Apply a JS-style threshold: levels numbered below it are no-ops."""
+        self.level = level
+        for key, lvl in LogLevels.items():
+            if level > lvl["level"]:
+                setattr(self, key, _noop)
+            else:
+                # fall back to the class's method
+                self.__dict__.pop(key, None)
 
     def _get_ansi_label(self, lvl):
         bg_r, bg_g, bg_b = hex_to_rgb(lvl["label"]["bgColor"])
@@ -136,27 +359,9 @@ class Logger:
 
         return wrap
 
-    def _build_message(self, lvl, *args):
+    def _build_label(self, lvl):
         whitespace = " " if len(lvl["name"]) == 4 else ""
-        label_fn = self._get_ansi_label(lvl)
-        log_label = label_fn(f"[{lvl['name']}]")
-        now = datetime.datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
-        padded_name = settings.app_name.ljust(APP_LOG_ID_WIDTH)
-        parts = [whitespace + log_label, now, "-", padded_name + ":"]
-        parts.extend(str(a) for a in args)
-        return parts
-
-    def _send_to_server(self, msg_str):
-        if not settings.logging_server:
-            return
-        data = msg_str.encode("utf-8")
-        req = urllib.request.Request(
-            settings.logging_server, data=data, method="POST"
-        )
-        try:
-            urllib.request.urlopen(req, timeout=2)
-        except Exception:
-            pass
+        return whitespace + self._get_ansi_label(lvl)(f"[{lvl['name']}]")
 
     def _map_to_python_level(self, lvl_name):
         return {
@@ -168,39 +373,29 @@ class Logger:
             "TRACE": TRACE_LEVEL_NUM,
         }[lvl_name]
 
-    def _log(self, lvl, *args):
-        # JS‐style threshold
-        if settings.log_level > lvl["level"]:
-            return
-
-        parts = self._build_message(lvl, *args)
-        msg_str = " ".join(parts)
-
-        # fire‐and‐forget to HTTP server
-        self._send_to_server(msg_str)
-
-        py_level = self._map_to_python_level(lvl["name"])
-        # emit via python logging
-        # we pass msg_str as the “message”; no params
-        self.logger.log(py_level, msg_str)
+    def _log(self, py_level, args):
+        # no caller lookup here, and only the message is built; the listener thread formats the record
+        message = " ".join(str(a) for a in args)
+        record = logging.LogRecord(self.logger.name, py_level, "", 0, message, None, None)
+        self.logger.handle(record)
 
     def fatal(self, *args):
-        self._log(LogLevels["fatal"], *args)
+        self._log(logging.CRITICAL, args)
 
     def error(self, *args):
-        self._log(LogLevels["error"], *args)
+        self._log(logging.ERROR, args)
 
     def warn(self, *args):
-        self._log(LogLevels["warn"], *args)
+        self._log(logging.WARNING, args)
 
     def info(self, *args):
-        self._log(LogLevels["info"], *args)
+        self._log(logging.INFO, args)
 
     def debug(self, *args):
-        self._log(LogLevels["debug"], *args)
+        self._log(logging.DEBUG, args)
 
     def trace(self, *args):
-        self._log(LogLevels["trace"], *args)
+        self._log(TRACE_LEVEL_NUM, args)
 
 
 logger = Logger()
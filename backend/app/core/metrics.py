@@ -1,9 +1,15 @@
 import os
+import re
+import time
+import fcntl
+import asyncio
+import contextlib
 
 from fastapi import Depends
 from starlette.responses import Response
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
 from prometheus_fastapi_instrumentator import Instrumentator
-from prometheus_client import CollectorRegistry, multiprocess, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess, generate_latest, CONTENT_TYPE_LATEST
 
 from app.app import app
 from app.core.logger import logger
@@ -14,19 +20,147 @@ settings = get_settings()
 
 instrumentator = Instrumentator(should_instrument_requests_inprogress=True).instrument(app)
 
+scrape_duration = Histogram("metrics_scrape_duration_seconds", "Time taken to render /metrics, excluding cached scrapes",
+                            buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5])
+compacted_files = Counter("metrics_compacted_files_total", "Metric files of dead workers merged into the archive")
+
+# files of summed metrics that belong to a single worker; gauges keep their pid, so they are never merged
+WORKER_FILE = re.compile(r"^(counter|histogram|summary)_(\d+)\.db$")
+
+
+def _alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CompactingMultiProcessCollector(multiprocess.MultiProcessCollector):
+    """
+    Multiprocess collector that folds the files of dead workers into one archive file per metric type.
+
+    Without this, every worker that has ever run leaves its files behind and
+    every scrape re-reads all of them. Compaction and reads are serialised with
+    a lock file, so that a scrape never sees a worker both in its own files
+    and in the archive.
+    """
+
+    def __init__(self, registry, path=None, compact: bool = True):
+        super().__init__(registry, path)
+        self.compact_dead_workers = compact
+        self._lock_path = os.path.join(self._path, ".compaction.lock")
+
+    @contextlib.contextmanager
+    def _locked(self, operation: int):
+        with open(self._lock_path, "a") as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def compact(self):
+        dead: dict[str, list[str]] = {}
+        pids = set()
+        for name in os.listdir(self._path):
+            match = WORKER_FILE.match(name)
+            if match and not _alive(int(match[2])):
+                dead.setdefault(match[1], []).append(os.path.join(self._path, name))
+                pids.add(int(match[2]))
+        if not dead:
+            return
+        try:
+            with self._locked(fcntl.LOCK_EX | fcntl.LOCK_NB):
+                for typ, files in dead.items():
+                    self._compact(typ, [file for file in files if os.path.exists(file)])
+        except BlockingIOError:
+            # another worker is compacting
+            return
+        for pid in pids:
+            multiprocess.mark_process_dead(pid, self._path)
+
+    def _compact(self, typ: str, files: list[str]):
+        if not files:
+            return
+        archive = os.path.join(self._path, f"{typ}_archive.db")
+        sources = files + [archive] if os.path.exists(archive) else files
+        metrics = self.merge(sources, accumulate=False)
+
+        staging = f"{archive}.tmp"
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(staging)
+        values = MmapedDict(staging)
+        try:
+            for metric in metrics:
+                for sample in metric.samples:
+                    key = mmap_key(metric.name, sample.name, list(sample.labels), list(sample.labels.values()),
+                                   metric.documentation)
+                    values.write_value(key, sample.value, 0)
+        finally:
+            values.close()
+        os.replace(staging, archive)
+        for file in files:
+            os.remove(file)
+        compacted_files.inc(len(files))
+
+    def collect(self):
+        if self.compact_dead_workers:
+            self.compact()
+        with self._locked(fcntl.LOCK_SH):
+            return list(super().collect())
+
+
+class MetricsCache:
+    """
+    Rendered /metrics output, shared by the scrapes within `ttl` seconds of each other.
+
+    Rendering runs in a thread, and concurrent scrapes wait for the one that
+    is already rendering instead of starting their own.
+    """
+
+    def __init__(self, registry: CollectorRegistry, ttl: float):
+        self.registry = registry
+        self.ttl = ttl
+        self._body: bytes | None = None
+        self._expiry = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self) -> bytes:
+        if self._body is not None and time.monotonic() < self._expiry:
+            return self._body
+        async with self._lock:
+            if self._body is not None and time.monotonic() < self._expiry:
+                return self._body
+            start = time.perf_counter()
+            self._body = await asyncio.to_thread(generate_latest, self.registry)
+            scrape_duration.observe(time.perf_counter() - start)
+            self._expiry = time.monotonic() + self.ttl
+            return self._body
+
+
+def create_metrics_registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return instrumentator.registry
+    registry = CollectorRegistry()
+    CompactingMultiProcessCollector(registry, compact=settings.metrics_compact_dead_workers)
+    return registry
+
+
+metrics_cache = MetricsCache(create_metrics_registry(), ttl=settings.metrics_cache_ttl)
+
 
 @app.get("/metrics", response_model=dict)
 async def get_metrics(_auth=Depends(metrics_scheme)):
-    ephemeral_registry = instrumentator.registry
-    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
-        ephemeral_registry = CollectorRegistry()
-        multiprocess.MultiProcessCollector(ephemeral_registry)
-
-    resp = Response(content=generate_latest(ephemeral_registry))
+    resp = Response(content=await metrics_cache.get())
     resp.headers["Content-Type"] = CONTENT_TYPE_LATEST
 
     return resp
 
 
 def configure_metrics():
-    logger.info("Metrics configured")
\ No newline at end of file
+    logger.info("Metrics configured")
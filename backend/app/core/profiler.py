@@ -0,0 +1,141 @@
+import sys
+import time
+import marshal
+import asyncio
+import threading
+import collections
+from weakref import WeakKeyDictionary
+
+from starlette.responses import Response
+from fastapi import Depends, FastAPI, HTTPException, Query, status
+
+from app.core.logger import logger
+
+# stacks sampled while no socket event was running
+UNATTRIBUTED = "<other>"
+
+
+def _label(code) -> str:
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Samples the event loop thread's stack from a background thread.
+
+    Each sample is attributed to the `socket_event` whose task was running at
+    the time, which `attribute` records for the task. Nothing is recorded and
+    no thread runs unless a profile is being taken, so the only cost while
+    idle is the `running` check in the socket event wrapper.
+    """
+
+    def __init__(self):
+        self.running = False
+        self._tasks: WeakKeyDictionary[asyncio.Task, str] = WeakKeyDictionary()
+        self._samples: collections.Counter[tuple] = collections.Counter()
+
+    def attribute(self, event: str):
+        task = asyncio.current_task()
+        if task is not None:
+            self._tasks[task] = event
+
+    def _sample(self, loop: asyncio.AbstractEventLoop, thread_id: int, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(loop)
+            event = UNATTRIBUTED if task is None else self._tasks.get(task, UNATTRIBUTED)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            self._samples[(event, tuple(reversed(stack)))] += 1
+
+    async def profile(self, seconds: float, interval: float) -> collections.Counter[tuple]:
+        """Sample the running loop for `seconds`, returning a count per (event, stack from the root)."""
+        if self.running:
+            raise RuntimeError("A profile is already being taken")
+        self.running = True
+        self._samples = collections.Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, daemon=True, name="profiler",
+                                   args=(asyncio.get_running_loop(), threading.get_ident(), interval, stop))
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            await asyncio.to_thread(sampler.join)
+            self.running = False
+            self._tasks.clear()
+        return self._samples
+
+
+def collapsed(samples: collections.Counter[tuple]) -> str:
+    """Samples in the collapsed-stack format read by flamegraph.pl and speedscope."""
+    lines = []
+    for (event, stack), count in samples.items():
+        lines.append(";".join([event, *map(_label, stack)]) + f" {count}")
+    return "\n".join(sorted(lines)) + "\n"
+
+
+def pstats_dump(samples: collections.Counter[tuple], interval: float) -> bytes:
+    """
+    Samples as a marshalled `pstats.Stats` file, with each event as a root
+    function that calls everything sampled while it ran.
+    """
+    stats: dict[tuple, list] = {}
+    for (event, stack), count in samples.items():
+        elapsed = count * interval
+        functions = [("<socket event>", 0, event)] + [(c.co_filename, c.co_firstlineno, c.co_qualname) for c in stack]
+        seen = set()
+        for i, function in enumerate(functions):
+            entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+            if function not in seen:
+                # recursive functions count once per sample towards their cumulative time
+                seen.add(function)
+                entry[0] += count
+                entry[1] += count
+                entry[3] += elapsed
+            if i == len(functions) - 1:
+                entry[2] += elapsed
+            if i > 0:
+                caller = entry[4].setdefault(functions[i - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[3] += elapsed
+                if i == len(functions) - 1:
+                    caller[2] += elapsed
+    return marshal.dumps({function: (cc, nc, tt, ct, {caller: tuple(v) for caller, v in callers.items()})
+                          for function, (cc, nc, tt, ct, callers) in stats.items()})
+
+
+profiler = SamplingProfiler()
+
+
+async def get_profile(
+        seconds: float = Query(10, gt=0, le=300),
+        interval: float = Query(0.005, ge=0.001, le=1),
+        output: str = Query("collapsed", pattern="^(collapsed|pstats)$"),
+):
+    """Profile the socket server for `seconds`, as collapsed stacks or a pstats file."""
+    logger.info(f"Profiling for {seconds}s")
+    start = time.monotonic()
+    try:
+        samples = await profiler.profile(seconds, interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    logger.info(f"Took {sum(samples.values())} samples in {time.monotonic() - start:.1f}s")
+    if output == "pstats":
+        return Response(pstats_dump(samples, interval), media_type="application/octet-stream",
+                        headers={"Content-Disposition": 'attachment; filename="profile.pstats"'})
+    return Response(collapsed(samples), media_type="text/plain")
+
+
+def configure_profiler(app: FastAPI):
+    # imported here, so that the socket layer can use the profiler without importing the app
+    from app.core.auth import metrics_scheme
+
+    app.get("/admin/profile", dependencies=[Depends(metrics_scheme)])(get_profile)
+    logger.info("Profiler configured")
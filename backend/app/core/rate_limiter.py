@@ -1,30 +1,139 @@
-from fastapi import Request
+import re
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from fastapi import FastAPI, Request
 from slowapi import Limiter
 from fastapi.responses import JSONResponse
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
+from prometheus_client import Counter
+from redis import asyncio as aioredis
 
-from app.app import app
 from app.core.logger import logger
 from app.core.config import get_settings
+from app.core.cache import create_redis
 
 settings = get_settings()
 limiter = Limiter(key_func=get_remote_address)
 
 
-def configure_limiter():
+def configure_limiter(app: FastAPI):
     # noinspection PyUnresolvedReferences
     app.state.limiter = limiter
     # noinspection PyTypeChecker
     app.add_middleware(SlowAPIMiddleware)
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
     logger.info("Rate limiting configured")
 
 
 # noinspection PyUnusedLocal
-@app.exception_handler(RateLimitExceeded)
 async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
     return JSONResponse(
         status_code=429,
         content={"detail": "Too many requests. Please try again later."},
-    )
\ No newline at end of file
+    )
+
+socket_rate_limited = Counter("socket_rate_limited_total", "Socket.io events rejected by a rate limit",
+                              ["event", "scope"])
+
+_RATE = re.compile(r"^\s*(\d+)\s*(?:/|per)\s*(\d+)?\s*(second|minute|hour|day)s?\s*$")
+_PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+class Rate(NamedTuple):
+    """A token bucket holding up to `limit` tokens, refilled at `limit / period` tokens per second."""
+
+    limit: int
+    period: float
+
+    @classmethod
+    def parse(cls, rate: str) -> "Rate":
+        """Parse a slowapi-style rate such as `10/second` or `5 per 10 seconds`."""
+        match = _RATE.match(rate)
+        if match is None:
+            raise ValueError(f"Unsupported rate: {rate}")
+        limit, multiple, unit = match.groups()
+        return cls(int(limit), int(multiple or 1) * _PERIODS[unit])
+
+
+class MemoryTokenBuckets:
+    """
+    Token buckets in this worker's memory.
+
+    At most `max_keys` buckets are kept; the least recently used is dropped
+    first, which only ever forgives a client (its bucket starts full again).
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, list[float]] = OrderedDict()
+
+    async def acquire(self, key: str, rate: Rate) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [rate.limit, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(rate.limit, bucket[0] + (now - bucket[1]) * rate.limit / rate.period)
+            bucket[1] = now
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+
+class RedisTokenBuckets:
+    """
+    Token buckets shared between workers, one Redis hash per bucket.
+
+    Each check is a single script call, timed by the Redis server's clock.
+    Buckets expire once they would have refilled.
+    """
+
+    SCRIPT = """
+    local limit = tonumber(ARGV[1])
+    local period = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local tokens = tonumber(bucket[1]) or limit
+    local stamp = tonumber(bucket[2]) or now
+    tokens = math.min(limit, tokens + math.max(0, now - stamp) * limit / period)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil(period * 1000))
+    return allowed
+    """
+
+    def __init__(self, redis: aioredis.Redis, prefix: str):
+        self.prefix = prefix
+        self._script = redis.register_script(self.SCRIPT)
+
+    async def acquire(self, key: str, rate: Rate) -> bool:
+        try:
+            return bool(await self._script(keys=[f"{self.prefix}:{key}"], args=[rate.limit, rate.period]))
+        except Exception as e:
+            # fail open, so that a Redis outage does not silence every room
+            logger.warn(f"Failed to check socket rate limit: {e!r}")
+            return True
+
+
+def create_socket_buckets() -> MemoryTokenBuckets | RedisTokenBuckets:
+    if settings.socket_rate_limit_backend == "memory":
+        return MemoryTokenBuckets(settings.socket_rate_limit_max_keys)
+    if settings.socket_rate_limit_backend != "redis":
+        raise ValueError(f"Unsupported socket rate limit backend: {settings.socket_rate_limit_backend}")
+    return RedisTokenBuckets(create_redis(), prefix=f"{settings.cache_prefix}:ratelimit")
+
+
+socket_buckets = create_socket_buckets()
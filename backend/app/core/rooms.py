@@ -0,0 +1,52 @@
+from prometheus_client import Gauge
+
+room_count = Gauge("socket_rooms", "Number of socket.io rooms with at least one member")
+room_members = Gauge("socket_room_members", "Number of sockets that are members of a room")
+
+
+class RoomMembership:
+    """
+    Index of which room each socket is in and how many members each room has.
+
+    A socket is a member of at most one room. Joins, leaves and lookups are all
+    O(1), so disconnect storms no longer scan every connected socket.
+    """
+
+    def __init__(self):
+        self._room_of: dict[str, str] = {}
+        self._counts: dict[str, int] = {}
+
+    def room_of(self, sid: str) -> str | None:
+        return self._room_of.get(sid)
+
+    def members(self, room: str) -> int:
+        return self._counts.get(room, 0)
+
+    def join(self, sid: str, room: str) -> bool:
+        """Add `sid` to `room`, returning True if it is the room's first member."""
+        previous = self._room_of.get(sid)
+        if previous == room:
+            return False
+        if previous is not None:
+            self.leave(sid)
+        self._room_of[sid] = room
+        count = self._counts.get(room, 0) + 1
+        self._counts[room] = count
+        room_members.inc()
+        if count == 1:
+            room_count.inc()
+        return count == 1
+
+    def leave(self, sid: str) -> tuple[str | None, bool]:
+        """Remove `sid` from its room, returning the room and whether it is now empty."""
+        room = self._room_of.pop(sid, None)
+        if room is None:
+            return None, False
+        count = self._counts[room] - 1
+        room_members.dec()
+        if count:
+            self._counts[room] = count
+            return room, False
+        del self._counts[room]
+        room_count.dec()
+        return room, True
@@ -0,0 +1,146 @@
+import heapq
+import asyncio
+import itertools
+from typing import Awaitable, Callable
+
+from prometheus_client import Gauge
+
+from app.core.logger import logger
+
+event_loop_lag = Gauge("event_loop_lag_seconds", "How late the event loop last ran a timer that was due")
+
+
+class ScheduledTick:
+    """Handle for a periodic action registered with a `TickScheduler`."""
+
+    __slots__ = ("action", "interval", "due", "cancelled", "running")
+
+    def __init__(self, action: Callable[[], Awaitable[None]], interval: float, due: float):
+        self.action = action
+        self.interval = interval
+        self.due = due
+        self.cancelled = False
+        self.running = False
+
+    def cancel(self):
+        # cancelled ticks are dropped lazily when they reach the head of the heap
+        self.cancelled = True
+
+
+class TickScheduler:
+    """
+    Runs periodic async actions on the server's event loop.
+
+    All ticks live in one heap keyed by their next due time and a single loop
+    timer is armed for the earliest one. Ticks are drift-free (the n-th tick of
+    an action is due at `start + n * interval`) and every tick that is due when
+    the timer fires is dispatched in the same loop iteration.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, ScheduledTick]] = []
+        self._counter = itertools.count()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._timer_due: float | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def schedule(self, action: Callable[[], Awaitable[None]], interval: float) -> ScheduledTick:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # bound to a new loop (e.g. after a restart), so drop the old one's state
+            self._reset(loop)
+        tick = ScheduledTick(action, interval, loop.time() + interval)
+        heapq.heappush(self._heap, (tick.due, next(self._counter), tick))
+        self._arm()
+        return tick
+
+    def _reset(self, loop: asyncio.AbstractEventLoop):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._heap.clear()
+        self._tasks.clear()
+        self._timer = None
+        self._timer_due = None
+        self._loop = loop
+
+    def _arm(self):
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+            self._timer_due = None
+            return
+        due = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer_due <= due:
+                return
+            self._timer.cancel()
+        self._timer = self._loop.call_at(due, self._fire)
+        self._timer_due = due
+
+    def _fire(self):
+        self._timer = None
+        self._timer_due = None
+        now = self._loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, tick = heapq.heappop(self._heap)
+            if tick.cancelled:
+                continue
+            if not tick.running:
+                self._dispatch(tick)
+            # skip missed ticks instead of firing them in a burst
+            tick.due += tick.interval * (int((now - tick.due) // tick.interval) + 1)
+            heapq.heappush(self._heap, (tick.due, next(self._counter), tick))
+        self._arm()
+
+    def _dispatch(self, tick: ScheduledTick):
+        tick.running = True
+        task = self._loop.create_task(self._run(tick))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _run(tick: ScheduledTick):
+        try:
+            await tick.action()
+        except Exception as e:
+            logger.error(f"Scheduled tick failed: {e!r}")
+        finally:
+            tick.running = False
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: a timer is armed every `interval` seconds and
+    the delay between when it was due and when the loop got round to it is
+    reported as `event_loop_lag_seconds`.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._due = 0.0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._arm()
+
+    def _arm(self):
+        self._due = self._loop.time() + self.interval
+        self._timer = self._loop.call_at(self._due, self._check)
+
+    def _check(self):
+        event_loop_lag.set(max(0.0, self._loop.time() - self._due))
+        self._arm()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+scheduler = TickScheduler()
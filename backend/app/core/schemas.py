@@ -1,4 +1,4 @@
-from typing import Optional, Type, Container
+from typing import Any, Optional, Type, Container
 
 from sqlalchemy import inspect
 from sqlalchemy.orm import ColumnProperty
@@ -45,6 +45,28 @@ class GetStatePayload(BaseModel):
     text: str
     arc_width: float
     select_county_event: Optional[SelectCountyBroadcastPayload] = None
+    version: int = 0
+
+
+class StateDeltaRequestPayload(BaseModel):
+    """Client request for the changes since the state version it last applied."""
+
+    since: int
+
+
+class StatePatchPayload(BaseModel):
+    """The `State.to_dict()` fields that changed between two state versions."""
+
+    from_version: int
+    to_version: int
+    patch: dict[str, Any]
+
+
+class StateDeltaPayload(BaseModel):
+    """Server response for get_state_delta (ack): a patch, or a full snapshot when the patch is unavailable."""
+
+    patch: Optional[StatePatchPayload] = None
+    snapshot: Optional[GetStatePayload] = None
 
 
 class OrmConfig(ConfigDict):
@@ -0,0 +1,46 @@
+import functools
+from http.cookies import SimpleCookie
+
+from fastapi import HTTPException, status
+
+from app.core.state import sessions
+from app.core.config import get_settings
+
+settings = get_settings()
+
+
+def _get_token_from_environ(environ: dict) -> str | None:
+    # ASGIApp passes the scope in environ under "asgi.scope"
+    scope = environ.get("asgi.scope", {})
+    headers = scope.get("headers", [])
+    cookie_header = next(
+        (v.decode() for k, v in headers if k == b"cookie"), ""
+    )
+    cookie = SimpleCookie()
+    cookie.load(cookie_header)
+    morsel = cookie.get("session")
+    return morsel.value if morsel else None
+
+
+async def authenticate(environ):
+    token = _get_token_from_environ(environ)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
+    # signed sessions are verified in-process, against a revocation list every session store keeps in memory;
+    # looking unsigned sessions up would cost every handshake with the Redis store a round trip
+    if settings.signed_sessions and not await sessions.validate_session(token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid token")
+
+
+def socket_auth(func):
+    @functools.wraps(func)
+    async def wrapper(self, sid, environ, *args, **kwargs):
+        # await the original authenticate
+        if settings.disable_auth:
+            auth = None
+        else:
+            auth = await authenticate(environ)
+        # call the underlying method, injecting `auth`
+        return await func(self, sid, environ, auth, *args, **kwargs)
+
+    return wrapper
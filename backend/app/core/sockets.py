@@ -1,27 +1,210 @@
 import json
 import time
+import asyncio
+import hashlib
 import inspect
+import functools
 from pathlib import Path
 from types import UnionType
 from typing import Any, Dict, Optional, Type, Union, get_origin, get_args, Callable, Literal
 
 import socketio
+from socketio import packet
+from engineio import packet as eio_packet
 from fastapi import FastAPI
 from fastapi_cache import FastAPICache
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError
 from prometheus_client import Counter, Gauge, Histogram
 
+from app.core import codec
 from app.core.logger import logger
 from app.core.config import get_settings
+from app.core.profiler import profiler
+from app.core.rate_limiter import Rate, socket_buckets, socket_rate_limited
 
 settings = get_settings()
-sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins=[])
-sio_app = socketio.ASGIApp(sio, socketio_path=f"{settings.base_path}/ws/socket.io")
 
 active_connections = Gauge("socket_active_connections", "Current number of active socket.io connections")
 event_counter = Counter("socket_events_total", "Total number of socket.io events processed", ["event"])
 event_duration = Histogram("socket_event_duration_seconds", "Duration of socket.io event handlers in seconds",
                            ["event"], buckets=[0.001, 0.01, 0.1, 1, 5])
+pubsub_publish_duration = Histogram("socket_pubsub_publish_duration_seconds",
+                                    "Time taken to publish a socket.io message to the other workers",
+                                    buckets=[0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 1])
+pubsub_queue_depth = Gauge("socket_pubsub_queue_depth",
+                           "Messages received from other workers that are waiting to be delivered")
+coalesced_events = Counter("socket_coalesced_events_total",
+                           "Socket.io events superseded by a later one within their coalescing window", ["event"])
+pubsub_messages = Counter("socket_pubsub_messages_total", "Socket.io messages exchanged with other workers",
+                          ["direction"])
+event_phase_duration = Histogram("socket_event_phase_duration_seconds",
+                                 "Time spent in each phase of handling a socket.io event", ["event", "phase"],
+                                 buckets=[0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 1])
+PAYLOAD_BUCKETS = [64, 256, 1024, 4096, 16384, 65536, 262144, 1048576]
+inbound_payload_size = Histogram("socket_inbound_payload_bytes", "Size of socket.io packets received from clients",
+                                 ["event"], buckets=PAYLOAD_BUCKETS)
+outbound_payload_size = Histogram("socket_outbound_payload_bytes",
+                                  "Size of encoded socket.io packets sent, once per emit however many receive it",
+                                  ["event"], buckets=PAYLOAD_BUCKETS)
+
+
+class BroadcastManager(socketio.AsyncManager):
+    """
+    Client manager that writes each emit's Engine.IO packet to every
+    recipient in turn, instead of scheduling a task per recipient and
+    waiting for all of them as the stock manager does. A send only puts the
+    packet on the socket's unbounded outgoing queue, so a slow client does
+    not hold up the ones after it; the exception is a client past its ping
+    timeout, which is closed by the send, running its disconnect handler.
+    Skipping the tasks makes a 5,000 member broadcast ~12x cheaper (see
+    scripts/benchmarks/room_fanout.py).
+
+    Pydantic models can be emitted as they are: the codec serialises them
+    straight into the packet, without an intermediate `model_dump`.
+    """
+
+    async def emit(self, event, data, namespace, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        if callback is not None or namespace not in self.rooms or packet.Packet.data_is_binary(data):
+            return await super().emit(event, data, namespace, room=room, skip_sid=skip_sid, callback=callback,
+                                      to=to, **kwargs)
+        if isinstance(data, tuple):
+            data = list(data)
+        elif data is not None:
+            data = [data]
+        else:
+            data = []
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        encoded = self.server.packet_class(packet.EVENT, namespace=namespace, data=[event, *data]).encode()
+        outbound_payload_size.labels(event=event).observe(len(encoded))
+        eio_pkt = eio_packet.Packet(eio_packet.MESSAGE, encoded)
+        # collected up front, as sends may yield and let the room change underneath us
+        recipients = [eio_sid for sid, eio_sid in self.get_participants(namespace, to or room) if sid not in skip_sid]
+        for eio_sid in recipients:
+            try:
+                await self.server._send_eio_packet(eio_sid, eio_pkt)
+            except Exception as e:
+                logger.warn(f"Failed to send {event} to {eio_sid}: {e!r}")
+
+
+class InstrumentedRedisManager(socketio.AsyncRedisManager, BroadcastManager):
+    """
+    Redis pub/sub client manager that shares emits between workers.
+
+    Every emit is delivered to this worker's members and published once; each
+    of the other workers decodes the message once and delivers it to its own
+    members. Received messages are buffered in a bounded queue so that the
+    backlog is visible as `socket_pubsub_queue_depth`.
+    """
+
+    def __init__(self, url: str, channel: str, queue_size: int = 1000, redis_options: dict | None = None):
+        super().__init__(url, channel=channel, redis_options=redis_options)
+        self.queue_size = queue_size
+
+    async def _publish(self, data):
+        if isinstance(data.get("data"), BaseModel):
+            # the pub/sub channel is encoded with the stdlib, which cannot serialise models
+            data = {**data, "data": data["data"].model_dump(mode="json")}
+        start = time.monotonic()
+        try:
+            return await super()._publish(data)
+        finally:
+            pubsub_publish_duration.observe(time.monotonic() - start)
+            pubsub_messages.labels(direction="out").inc()
+
+    async def _listen(self):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        listen = super()._listen
+
+        async def receive():
+            async for message in listen():
+                # blocks when the queue is full, which pushes back on Redis
+                await queue.put(message)
+                pubsub_queue_depth.set(queue.qsize())
+
+        receiver = asyncio.create_task(receive())
+        try:
+            while True:
+                message = await queue.get()
+                pubsub_queue_depth.set(queue.qsize())
+                pubsub_messages.labels(direction="in").inc()
+                yield message
+        finally:
+            receiver.cancel()
+
+
+def create_client_manager() -> socketio.AsyncManager:
+    if settings.socket_manager == "local":
+        return BroadcastManager()
+    if settings.socket_manager != "redis":
+        raise ValueError(f"Unsupported socket manager: {settings.socket_manager}")
+    url = settings.socket_manager_url
+    redis_options = {}
+    if url is None:
+        url = f"{'rediss' if settings.secure_cache else 'redis'}://{settings.cache_host}:{settings.cache_port}/0"
+        redis_options["password"] = settings.cache_password
+        if settings.secure_cache:
+            redis_options.update(ssl_certfile=settings.cache_certfile, ssl_keyfile=settings.cache_keyfile,
+                                 ssl_cert_reqs="required", ssl_ca_certs=settings.ca_bundle_path)
+    return InstrumentedRedisManager(url, channel=settings.socket_manager_channel or f"{settings.cache_prefix}:sockets",
+                                    queue_size=settings.socket_manager_queue_size, redis_options=redis_options)
+
+
+def _encoded_size(encoded) -> int:
+    return sum(len(part) for part in encoded) if isinstance(encoded, list) else len(encoded)
+
+
+class InstrumentedServer(socketio.AsyncServer):
+    """
+    Socket.io server that records the size of every packet it receives or sends.
+
+    Received packets are labelled with their event only if a namespace
+    registered it, as clients choose the names.
+    """
+
+    _received_size = 0
+
+    async def _handle_eio_message(self, eio_sid, data):
+        self._received_size = len(data)
+        return await super()._handle_eio_message(eio_sid, data)
+
+    async def _handle_event(self, eio_sid, namespace, id, data):
+        info = _registry.get(namespace or "/")
+        known = info is not None and data and isinstance(data[0], str) and data[0] in info["events"]
+        event = data[0] if known else "unregistered"
+        inbound_payload_size.labels(event=event).observe(self._received_size)
+        return await super()._handle_event(eio_sid, namespace, id, data)
+
+    async def _send_packet(self, eio_sid, pkt):
+        encoded = pkt.encode()
+        # packets other than events (acks, connects) are labelled with their type
+        is_event = pkt.packet_type in (packet.EVENT, packet.BINARY_EVENT)
+        event = pkt.data[0] if is_event else packet.packet_names[pkt.packet_type].lower()
+        outbound_payload_size.labels(event=event).observe(_encoded_size(encoded))
+        for part in encoded if isinstance(encoded, list) else [encoded]:
+            await self.eio.send(eio_sid, part)
+
+
+def create_packet_class() -> Type[packet.Packet]:
+    if settings.socket_serializer == "json":
+        return packet.Packet
+    if settings.socket_serializer != "msgpack":
+        raise ValueError(f"Unsupported socket serializer: {settings.socket_serializer}")
+    # experimental: scripts/benchmarks/socket_serializer.py measures these packets at about the size of the JSON
+    # ones and slower to encode, and the frontend cannot decode them
+    try:
+        from socketio.msgpack_packet import MsgPackPacket
+    except ImportError as e:
+        raise ValueError("SOCKET_SERIALIZER=msgpack needs msgpack, from the `fast-codecs` extra") from e
+    return MsgPackPacket.configure(dumps_default=codec.to_builtins)
+
+
+# advertised for every message in the AsyncAPI specs
+content_type = "application/msgpack" if settings.socket_serializer == "msgpack" else "application/json"
+
+sio = InstrumentedServer(async_mode="asgi", cors_allowed_origins=[], client_manager=create_client_manager(),
+                         serializer=create_packet_class(), json=codec.SocketJson)
+sio_app = socketio.ASGIApp(sio, socketio_path=f"{settings.base_path}/ws/socket.io")
 
 _registry: Dict[str, Any] = {}
 
@@ -36,11 +219,22 @@ async def disconnect(_sid):
     active_connections.dec()
 
 
-def _schema_of(t: Optional[Union[Type[BaseModel], Type, UnionType]], base_path: str | None = None) -> Dict[str, Any] | list[Dict[str, Any]]:
+# nested models are defined once per spec, under components.schemas
+COMPONENT_REF = "#/components/schemas/{model}"
+
+
+@functools.cache
+def model_schema(model: Type[BaseModel], ref_template: str = COMPONENT_REF) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """A model's JSON Schema, computed once, split from the `$defs` of the models it nests."""
+    schema = model.model_json_schema(ref_template=ref_template)
+    return schema, schema.pop("$defs", {})
+
+
+def _schema_of(t: Optional[Union[Type[BaseModel], Type, UnionType]], definitions: Dict[str, Any]) -> Dict[str, Any] | list[Dict[str, Any]]:
     if t is type(None):
         return {"type": "null"}
     if get_origin(t) is UnionType:
-        return {"oneOf": [_schema_of(tt) for tt in get_args(t)]}
+        return {"oneOf": [_schema_of(tt, definitions) for tt in get_args(t)]}
     if get_origin(t) is Literal:
         values = get_args(t)
         if not values:
@@ -68,7 +262,9 @@ def _schema_of(t: Optional[Union[Type[BaseModel], Type, UnionType]], base_path:
             "enum": list(values),
         }
     if inspect.isclass(t) and issubclass(t, BaseModel):
-        return t.model_json_schema(ref_template=f"{base_path or '#/$defs'}/{{model}}")
+        schema, defs = model_schema(t)
+        definitions.update(defs)
+        return schema
     if t is int:
         return {"type": "integer"}
     if t is str:
@@ -80,10 +276,366 @@ def _schema_of(t: Optional[Union[Type[BaseModel], Type, UnionType]], base_path:
     raise ValueError(f"Unsupported schema type: {t}")
 
 
+def _is_model(t: Any) -> bool:
+    return inspect.isclass(t) and issubclass(t, BaseModel)
+
+
+def _compile_validator(t: Optional[Union[Type[BaseModel], Type, UnionType]]) -> Callable[[Any], Any] | None:
+    """Build the inbound payload validator for an event once, at decoration time."""
+    if t is None:
+        return None
+    if _is_model(t):
+        return t.model_validate
+    # strict mode keeps the isinstance() semantics for primitives and unions
+    return TypeAdapter(t, config=ConfigDict(strict=True)).validate_python
+
+
+def _compile_serializer(t: Optional[Union[Type[BaseModel], Type, UnionType]], dump: bool = True) -> Callable[[Any], Any]:
+    """
+    Build the response serializer for an event once, at decoration time.
+
+    With `dump=False` validated models are returned as they are, for emits
+    that the codec serialises directly.
+    """
+    if t is None:
+        return lambda _out: None
+    if _is_model(t):
+        if not dump:
+            return lambda out: out if type(out) is t else t.model_validate(out)
+
+        def serialize(out):
+            # handlers that already return the response model skip re-validation
+            if type(out) is t:
+                return out.model_dump()
+            return t.model_validate(out).model_dump()
+
+        return serialize
+    return TypeAdapter(t, config=ConfigDict(strict=True)).validate_python
+
+
+def _compile_limiter(event_name_, rate_, room_rate_, room_scoped: bool) -> Callable | None:
+    """Build the per-sid and per-room token bucket check for an event once, at decoration time."""
+    checks = []
+    if rate_ is not None:
+        checks.append(("sid", Rate.parse(rate_), lambda self, sid: sid))
+    if room_rate_ is not None:
+        if not room_scoped:
+            raise ValueError(f"room_rate on {event_name_} needs a namespace that defines room_of(sid)")
+        checks.append(("room", Rate.parse(room_rate_), lambda self, sid: self.room_of(sid) or sid))
+    if not checks:
+        return None
+    checks = [(scope, rate, scope_of, socket_rate_limited.labels(event=event_name_, scope=scope))
+              for scope, rate, scope_of in checks]
+
+    async def allow(self, sid) -> bool:
+        for scope, rate, scope_of, rejected in checks:
+            if not await socket_buckets.acquire(f"{event_name_}:{scope}:{scope_of(self, sid)}", rate):
+                rejected.inc()
+                return False
+        return True
+
+    return allow
+
+
+def _compile_coalescer(event_name_, window: float, room_scoped: bool, dispatch) -> Callable[..., bool]:
+    """
+    Build a last-write-wins window for an event: the first event of a room
+    (or, outside room-scoped namespaces, of a sender) is dispatched at once and
+    opens a `window`-second window. Events arriving within it only replace the
+    pending one, which is dispatched when the window closes and opens the next.
+
+    The returned function's `flush(self, sid)` dispatches a sender's pending
+    events right away, so that they still run in its room when it disconnects.
+    """
+    windows: dict[str, tuple | None] = {}
+    # dispatches in progress -> their sender
+    running: dict[asyncio.Task, str] = {}
+    merged = coalesced_events.labels(event=event_name_)
+
+    async def run(pending):
+        if profiler.running:
+            profiler.attribute(event_name_)
+        try:
+            await dispatch(*pending)
+        except Exception as e:
+            logger.error(f"Coalesced {event_name_} failed: {e!r}")
+
+    def schedule(pending) -> asyncio.Task:
+        task = asyncio.create_task(run(pending))
+        running[task] = pending[1]
+        task.add_done_callback(running.pop)
+        return task
+
+    def close(key):
+        pending = windows.pop(key)
+        if pending is not None:
+            open_(key)
+            schedule(pending)
+
+    def open_(key):
+        windows[key] = None
+        asyncio.get_running_loop().call_later(window, close, key)
+
+    def defer(self, sid, parsed) -> bool:
+        """Hold the event back if its window is open, returning True if it was."""
+        key = (self.room_of(sid) or sid) if room_scoped else sid
+        if key not in windows:
+            open_(key)
+            return False
+        if windows[key] is not None:
+            merged.inc()
+        windows[key] = (self, sid, parsed)
+        return True
+
+    async def flush(self, sid):
+        tasks = [task for task, sender in running.items() if sender == sid]
+        for key, pending in windows.items():
+            if pending is not None and pending[1] == sid:
+                windows[key] = None
+                tasks.append(schedule(pending))
+        if tasks:
+            await asyncio.wait(tasks)
+
+    defer.flush = flush
+    return defer
+
+
+def _compile_trailer(event_name_, delay: float, allow, dispatch) -> Callable:
+    """
+    Build a rate limited dispatch that holds back, rather than rejects, the
+    latest of a sender's events over the limit, and retries it every `delay`
+    seconds until the limit lets it through. An event let through first
+    supersedes the held one, so that a burst always ends on its last value.
+
+    The returned function's `flush(self, sid)` dispatches a sender's held
+    event right away, so that it still runs in its room when it disconnects.
+    """
+    held: dict[str, tuple] = {}
+    # retries in progress -> their sender
+    running: dict[asyncio.Task, str] = {}
+
+    async def run(pending):
+        if profiler.running:
+            profiler.attribute(event_name_)
+        try:
+            await trail(*pending)
+        except Exception as e:
+            logger.error(f"Held back {event_name_} failed: {e!r}")
+
+    def retry(sid):
+        pending = held.pop(sid, None)
+        if pending is not None:
+            task = asyncio.create_task(run(pending))
+            running[task] = sid
+            task.add_done_callback(running.pop)
+
+    async def trail(self, sid, parsed):
+        if await allow(self, sid):
+            held.pop(sid, None)
+            return await dispatch(self, sid, parsed)
+        if sid not in held:
+            asyncio.get_running_loop().call_later(delay, retry, sid)
+        held[sid] = (self, sid, parsed)
+
+    async def flush(self, sid):
+        tasks = [task for task, sender in running.items() if sender == sid]
+        if tasks:
+            await asyncio.wait(tasks)
+        pending = held.pop(sid, None)
+        if pending is not None:
+            await dispatch(*pending)
+
+    trail.flush = flush
+    return trail
+
+
+def _compile_event(fn, event_name_, payload_, response_, response_event_, ack_, key_builder_, cache_enabled_,
+                   rate_=None, room_rate_=None, coalesce_=None, trailing_=False, room_scoped: bool = False,
+                   versioned: bool = False):
+    """
+    Specialise the dispatch of one `socket_event` so that no type inspection,
+    label resolution or branching on the event's options happens per call.
+
+    Responses of `room_scoped` namespaces (those defining `room_of(sid)`) are
+    emitted to the sender's room, otherwise to the sender only. Cached responses
+    are keyed by room and, for `versioned` namespaces (those defining
+    `state_version(room)`), by the room's state version, so that any mutation
+    invalidates them immediately. The cache is shared between workers, so the
+    version has to mean the same state on all of them.
+
+    Rate limits are checked before validation, except for coalesced and
+    trailing events: those are limited as they are dispatched, so that events
+    a window merges away never count towards them, and trailing ones over the
+    limit are held back instead of rejected.
+
+    Phases are only timed with `SOCKET_PHASE_TIMING`: each observation costs
+    about as much as the rest of a dispatch (see
+    scripts/benchmarks/socket_dispatch.py).
+    """
+    if coalesce_ and ack_:
+        raise ValueError(f"{event_name_} acknowledges every event, so it cannot be coalesced")
+    if trailing_ and (ack_ or (rate_ is None and room_rate_ is None)):
+        raise ValueError(f"{event_name_} cannot be trailing without a rate limit, or if it acknowledges every event")
+    validate = _compile_validator(payload_)
+    allow = _compile_limiter(event_name_, rate_, room_rate_, room_scoped)
+    responds = response_ is not None or response_event_ is not None
+    broadcasts = responds and not ack_ and response_event_ is not None
+    serialize = _compile_serializer(response_, dump=not broadcasts)
+    use_cache = cache_enabled_ and settings.cache_enabled and responds
+    calls = event_counter.labels(event=event_name_)
+    duration = event_duration.labels(event=event_name_)
+    timed = settings.socket_phase_timing
+    validation_phase, cache_phase, handler_phase, response_phase, emit_phase = (
+        event_phase_duration.labels(event=event_name_, phase=phase)
+        for phase in ("validation", "cache", "handler", "response_validation", "emit"))
+
+    if validate is None:
+        async def call(self, sid, _parsed):
+            return await fn(self, sid)
+    else:
+        call = fn
+
+    if not timed:
+        async def handle(self, sid, parsed):
+            out = await call(self, sid, parsed)
+            return serialize(out) if responds else None
+    else:
+        async def handle(self, sid, parsed):
+            start = time.perf_counter()
+            out = await call(self, sid, parsed)
+            handled = time.perf_counter()
+            handler_phase.observe(handled - start)
+            if not responds:
+                return None
+            out = serialize(out)
+            response_phase.observe(time.perf_counter() - handled)
+            return out
+
+    async def cache_key(self, sid, parsed) -> str:
+        room = (self.room_of(sid) or sid) if room_scoped else ""
+        version = await self.state_version(room) if versioned else 0
+        key = f"{FastAPICache.get_prefix()}:socket:{event_name_}:{room}:{version}"
+        if parsed is None and key_builder_ is None:
+            return key
+        digest = hashlib.blake2b(digest_size=8)
+        if parsed is not None:
+            digest.update(codec.canonical(parsed))
+        if key_builder_ is not None:
+            digest.update(codec.canonical(key_builder_()))
+        return f"{key}:{digest.hexdigest()}"
+
+    async def produce(self, sid, parsed):
+        if not use_cache:
+            return await handle(self, sid, parsed)
+        start = time.perf_counter()
+        backend = FastAPICache.get_backend()
+        key = await cache_key(self, sid, parsed)
+        cached_ = await backend.get(key)
+        lookup = time.perf_counter() - start
+        if cached_ is not None:
+            if timed:
+                cache_phase.observe(lookup)
+            return codec.loads(cached_)
+        payload_out = await handle(self, sid, parsed)
+        start = time.perf_counter()
+        await backend.set(key, codec.dumps(payload_out), settings.socket_cache_expiration)
+        if timed:
+            cache_phase.observe(lookup + time.perf_counter() - start)
+        return payload_out
+
+    async def dispatch(self, sid, parsed):
+        if not responds:
+            await handle(self, sid, parsed)
+            return
+
+        try:
+            payload_out = await produce(self, sid, parsed)
+        except ValidationError as e:
+            return await self.emit("error", {"error": str(e)}, room=sid)
+
+        if ack_:
+            return payload_out
+        if broadcasts:
+            start = time.perf_counter()
+            await self.emit(response_event_, payload_out,
+                            room=(self.room_of(sid) or sid) if room_scoped else sid)
+            if timed:
+                emit_phase.observe(time.perf_counter() - start)
+
+    async def reject(self, sid):
+        return await self.emit("error", {"error": f"Rate limit exceeded for {event_name_}"}, room=sid)
+
+    async def limited_dispatch(self, sid, parsed):
+        if not await allow(self, sid):
+            return await reject(self, sid)
+        return await dispatch(self, sid, parsed)
+
+    admit, dispatch_, defer, flushes = allow, dispatch, None, []
+    if trailing_:
+        rates = [Rate.parse(rate) for rate in (rate_, room_rate_) if rate is not None]
+        # retried as often as the tightest limit gains a token
+        trail = _compile_trailer(event_name_, max(rate.period / rate.limit for rate in rates), allow, dispatch)
+        admit, dispatch_ = None, trail
+        flushes.append(trail.flush)
+    elif coalesce_ and allow is not None:
+        admit, dispatch_ = None, limited_dispatch
+    if coalesce_:
+        defer = _compile_coalescer(event_name_, coalesce_, room_scoped, dispatch_)
+        # first, as the event it dispatches may be held back
+        flushes.insert(0, defer.flush)
+
+    async def wrapper(self, sid, data=None):
+        calls.inc()
+        if profiler.running:
+            profiler.attribute(event_name_)
+        start = time.monotonic()
+        try:
+            if admit is not None and not await admit(self, sid):
+                return await reject(self, sid)
+
+            parsed = None
+            if validate is not None:
+                validating = time.perf_counter()
+                try:
+                    parsed = validate(data)
+                except (ValidationError, TypeError) as e:
+                    return await self.emit("error", {"error": str(e)}, room=sid)
+                finally:
+                    if timed:
+                        validation_phase.observe(time.perf_counter() - validating)
+
+            if defer is not None and defer(self, sid, parsed):
+                return
+            return await dispatch_(self, sid, parsed)
+        finally:
+            duration.observe(time.monotonic() - start)
+
+    wrapper.__name__ = fn.__name__
+    wrapper.__qualname__ = fn.__qualname__
+    wrapper.flushes = flushes
+    return wrapper
+
+
+def _flush_on_disconnect(cls, flushes: list[Callable]):
+    """Dispatch a disconnecting socket's held back events before the namespace's `on_disconnect` runs."""
+    on_disconnect = getattr(cls, "on_disconnect", None)
+
+    async def wrapper(self, sid, *args):
+        for flush in flushes:
+            await flush(self, sid)
+        if on_disconnect is not None:
+            return await on_disconnect(self, sid, *args)
+
+    wrapper.__name__ = "on_disconnect"
+    wrapper.__qualname__ = f"{cls.__qualname__}.on_disconnect"
+    cls.on_disconnect = wrapper
+
+
 def socket_namespace(path: str):
     def decorator(cls: Type[socketio.Namespace]):
         events: Dict[str, Any] = {}
         publishes: Dict[str, Any] = {}
+        flushes: list[Callable] = []
         # wrap all @socket_event methods
         for _, method in inspect.getmembers(cls, inspect.isfunction):
             meta = getattr(method, "_socket_event", None)
@@ -96,91 +648,16 @@ def socket_namespace(path: str):
                     ack,
                     key_builder,
                     cache_enabled,
+                    rate,
+                    room_rate,
+                    coalesce,
+                    trailing,
                 ) = meta
 
-                def make_wrapper(fn, event_name_, payload_, response_, response_event_,
-                                 ack_, key_builder_, cache_enabled_):
-                    async def wrapper(self, sid, data=None):
-                        event_counter.labels(event=event_name_).inc()
-                        start = time.monotonic()
-                        try:
-                            try:
-                                parsed = data
-                                if payload_:
-                                    if inspect.isclass(payload_) and \
-                                            issubclass(payload_, BaseModel):
-                                        parsed = payload_.model_validate(data)
-                                    else:
-                                        if not isinstance(data, payload_):
-                                            raise TypeError(
-                                                f"Expected {payload_}, got {type(data)}"
-                                            )
-                                        parsed = data
-                            except (ValidationError, TypeError) as e:
-                                return await self.emit("error", {"error": str(e)},
-                                                       room=sid)
-
-                            if cache_enabled_ and settings.cache_enabled:
-                                backend = FastAPICache.get_backend()
-                                key = event_name_ + ((":", json.dumps(parsed)) if parsed is not None else "") + ((":"
-                                                                                                                  + json.dumps(
-                                            key_builder_(), sort_keys=True, default=str)))
-                                cached_ = await backend.get(key)
-                                if cached_ is not None:
-                                    result = json.loads(cached_.decode("utf-8"))
-                                else:
-                                    if parsed is not None:
-                                        result = await fn(self, sid, parsed)
-                                    else:
-                                        result = await fn(self, sid)
-                                    await backend.set(key, json.dumps(result).encode("utf-8"), settings.cache_expiration)
-                            else:
-                                if parsed is not None:
-                                    result = await fn(self, sid, parsed)
-                                else:
-                                    result = await fn(self, sid)
-
-                            if response_ or response_event_ is not None:
-                                try:
-                                    out = result
-                                    if inspect.isclass(response_) and \
-                                            issubclass(response_, BaseModel):
-                                        validated = response_.model_validate(out)
-                                        payload_out = validated.model_dump()
-                                    elif response_ is None:
-                                        payload_out = None
-                                    else:
-                                        if not isinstance(out, response_):
-                                            raise TypeError(
-                                                f"Expected {response_}, got {type(out)}"
-                                            )
-                                        payload_out = out
-
-                                    if ack_:
-                                        return payload_out
-                                    elif response_event_:
-                                        if self.rooms.get(sid, None) is not None:
-                                            await self.emit(response_event_,
-                                                            payload_out, room=self.rooms[sid])
-                                        else:
-                                            await self.emit(response_event_,
-                                                            payload_out,
-                                                            room=sid)
-
-                                except (ValidationError, TypeError) as e:
-                                    await self.emit("error", {"error": str(e)},
-                                                    room=sid)
-                        finally:
-                            event_duration.labels(event=event_name).observe(time.monotonic() - start)
-
-                    return wrapper
-
-                setattr(
-                    cls,
-                    method.__name__,
-                    make_wrapper(method, event_name, payload, response, response_event,
-                                 ack, key_builder, cache_enabled),
-                )
+                compiled = _compile_event(method, *meta, room_scoped=hasattr(cls, "room_of"),
+                                          versioned=hasattr(cls, "state_version"))
+                setattr(cls, method.__name__, compiled)
+                flushes.extend(compiled.flushes)
 
                 events[event_name] = {
                     "payload": payload,
@@ -189,6 +666,10 @@ def socket_namespace(path: str):
                     "ack": ack,
                     "key_builder": key_builder,
                     "cache_enabled": cache_enabled,
+                    "rate": rate,
+                    "room_rate": room_rate,
+                    "coalesce": coalesce,
+                    "trailing": trailing,
                 }
 
             pubs = getattr(method, "_socket_publish", None)
@@ -198,6 +679,8 @@ def socket_namespace(path: str):
                         "payload": payload,
                     }
 
+        if flushes:
+            _flush_on_disconnect(cls, flushes)
         instance = cls(path)
         sio.register_namespace(instance)
         _registry[path] = {"events": events, "publishes": publishes}
@@ -232,6 +715,10 @@ def socket_event(
         ack: bool = False,
         key_builder: Optional[Callable] = None,
         cache_enabled: Optional[bool] = False,
+        rate: Optional[str] = None,
+        room_rate: Optional[str] = None,
+        coalesce: Optional[float] = None,
+        trailing: bool = False,
 ):
     """
     - name: incoming event
@@ -241,21 +728,31 @@ def socket_event(
     - ack: if True, return the validated response so python-sio
                 will send it via the client's callback
     - key_builder: a callable that returns additional data as a dict for the cache key
+                   (the key is already scoped by room, state version and payload)
     - cache_prefix: a string that will be prefixed to the cache key
     - cache_enabled: whether to enable caching on this event
+    - rate: a limit per socket, e.g. "10/second"; events over it are rejected with an `error` event
+    - room_rate: a limit shared by every socket in the sender's room
+    - coalesce: a window in seconds (e.g. 0.016) within which only the latest event
+                of a room is applied and broadcast; intermediate ones are dropped
+    - trailing: hold back the latest event over `rate`/`room_rate` instead of rejecting it,
+                and apply it once the limit allows, so that a burst ends on its last value
     """
 
     def decorator(fn):
         setattr(fn, "_socket_event",
                 (name, payload, response, response_event,
-                ack, key_builder, cache_enabled))
+                ack, key_builder, cache_enabled, rate, room_rate, coalesce, trailing))
         return fn
 
     return decorator
 
 
-def generate_asyncapi(outfile: Path, title="", version="", url=""):
+def asyncapi_specs(title="", version="", url="") -> Dict[str, Dict[str, Any]]:
+    """Build the AsyncAPI spec of every registered namespace, keyed by its file name."""
+    specs = {}
     for ns, info in _registry.items():
+        definitions: Dict[str, Any] = {}
         spec = {
             "asyncapi": "3.0.0",
             "info": {"title": title, "version": version},
@@ -271,8 +768,8 @@ def generate_asyncapi(outfile: Path, title="", version="", url=""):
             chan["messages"] = {}
             if m["payload"]:
                 chan["messages"]["receive"] = {
-                    "contentType": "application/json",
-                    "payload": _schema_of(m["payload"], base_path=f"#/channels/{evt}/messages/receive/payload/$defs")
+                    "contentType": content_type,
+                    "payload": _schema_of(m["payload"], definitions)
                 }
                 spec["operations"][f"{evt}.receive"] = {
                     "action": "receive",
@@ -300,8 +797,8 @@ def generate_asyncapi(outfile: Path, title="", version="", url=""):
                 }
             if m["ack"]:
                 chan["messages"]["send"] = {
-                    "contentType": "application/json",
-                    "payload": _schema_of(m["response"], base_path=f"#/channels/{evt}/messages/send/payload/$defs"),
+                    "contentType": content_type,
+                    "payload": _schema_of(m["response"], definitions),
                 }
                 spec["operations"][f"{evt}.send"] = {
                     "action": "send",
@@ -327,8 +824,8 @@ def generate_asyncapi(outfile: Path, title="", version="", url=""):
                     response_chan["messages"] = {}
                 if m["response"]:
                     response_chan["messages"]["send"] = {
-                        "contentType": "application/json",
-                        "payload": _schema_of(m["response"], base_path=f"#/channels/{m["response_event"]}/messages/send/payload/$defs"),
+                        "contentType": content_type,
+                        "payload": _schema_of(m["response"], definitions),
                     }
                 else:
                     response_chan["messages"]["send"] = {}
@@ -352,8 +849,8 @@ def generate_asyncapi(outfile: Path, title="", version="", url=""):
             chan["address"] = evt
             chan["messages"] = chan.get("messages", {})
             chan["messages"]["send"] = {
-                "contentType": "application/json",
-                "payload": _schema_of(m["payload"], f"#/channels/{evt}/messages/send/payload/$defs"),
+                "contentType": content_type,
+                "payload": _schema_of(m["payload"], definitions),
             } if m["payload"] else {}
             spec["operations"][f"{evt}.send"] = {
                 "action": "send",
@@ -367,7 +864,15 @@ def generate_asyncapi(outfile: Path, title="", version="", url=""):
                 ]
             }
             spec["channels"][evt] = chan
-        (outfile / f"{ns.replace('/', '')}.json").write_text(json.dumps(spec, indent=2, sort_keys=False))
+        if definitions:
+            spec["components"] = {"schemas": definitions}
+        specs[f"{ns.replace('/', '')}.json"] = spec
+    return specs
+
+
+def generate_asyncapi(outfile: Path, title="", version="", url=""):
+    for name, spec in asyncapi_specs(title, version, url).items():
+        (outfile / name).write_text(json.dumps(spec, indent=2, sort_keys=False))
 
 
 def configure_sockets(app: FastAPI):
@@ -1,10 +1,234 @@
-from dataclasses import dataclass
+import hmac
+import time
+import heapq
+import asyncio
+import base64
+import hashlib
+import secrets
+from uuid import uuid4
 
+from redis import asyncio as aioredis
 
-@dataclass
-class State:
-    tokens: set[str]
-    cookies: set[str]
+from app.core.logger import logger
+from app.core.config import get_settings
+from app.core.cache import create_redis
 
+settings = get_settings()
 
-state = State(tokens=set(), cookies=set())
\ No newline at end of file
+
+class SessionStore:
+    """
+    In-process store of one-shot OTP tokens and session cookies.
+
+    Both are kept in a dict of token -> expiry, so validation is O(1). A heap
+    of expiries drives eviction: every call first pops whatever has expired,
+    so memory is bounded by the tokens issued within their TTL.
+    """
+
+    def __init__(self):
+        self._expiry: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def _purge(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expiry, key = heapq.heappop(self._heap)
+            # the key may have been consumed, or re-issued with a later expiry
+            if self._expiry.get(key) == expiry:
+                del self._expiry[key]
+
+    def _add(self, key: str, ttl: float):
+        now = time.monotonic()
+        self._purge(now)
+        self._expiry[key] = now + ttl
+        heapq.heappush(self._heap, (now + ttl, key))
+
+    def _valid(self, key: str) -> bool:
+        now = time.monotonic()
+        self._purge(now)
+        expiry = self._expiry.get(key)
+        return expiry is not None and expiry > now
+
+    async def issue_otp(self, ttl: int) -> str:
+        token = uuid4().hex
+        self._add(f"otp:{token}", ttl)
+        return token
+
+    async def consume_otp(self, token: str) -> bool:
+        """Validate an OTP token and revoke it, so that it can only be used once."""
+        key = f"otp:{token}"
+        if not self._valid(key):
+            return False
+        del self._expiry[key]
+        return True
+
+    async def create_session(self, ttl: int) -> str:
+        session = uuid4().hex
+        self._add(f"session:{session}", ttl)
+        return session
+
+    async def validate_session(self, session: str) -> bool:
+        return self._valid(f"session:{session}")
+
+    async def revoke_session(self, session: str):
+        self._expiry.pop(f"session:{session}", None)
+
+    async def revoke(self, token: str, ttl: int):
+        """Put a token that cannot be deleted, e.g. a signed session, on the revocation list for `ttl` seconds."""
+        self._add(f"revoked:{token}", ttl)
+
+    async def is_revoked(self, token: str) -> bool:
+        return self._valid(f"revoked:{token}")
+
+
+class RedisSessionStore(SessionStore):
+    """
+    OTP tokens and session cookies shared between workers, one Redis key each.
+
+    Keys expire with their TTL, so Redis does the eviction. An OTP is consumed
+    by deleting its key, which only one worker can do.
+
+    The revocation list is also mirrored in memory, so that checking it costs
+    no round trip: revocations are published to every worker, and the list is
+    reloaded whenever the subscription (re)connects. Until it is loaded,
+    lookups go to Redis.
+    """
+
+    def __init__(self, redis: aioredis.Redis, prefix: str):
+        super().__init__()
+        self.redis = redis
+        self.prefix = prefix
+        self._watcher: asyncio.Task | None = None
+        self._synced = asyncio.Event()
+
+    async def issue_otp(self, ttl: int) -> str:
+        token = uuid4().hex
+        await self.redis.set(f"{self.prefix}:otp:{token}", 1, ex=ttl)
+        return token
+
+    async def consume_otp(self, token: str) -> bool:
+        return await self.redis.delete(f"{self.prefix}:otp:{token}") == 1
+
+    async def create_session(self, ttl: int) -> str:
+        session = uuid4().hex
+        await self.redis.set(f"{self.prefix}:session:{session}", 1, ex=ttl)
+        return session
+
+    async def validate_session(self, session: str) -> bool:
+        return await self.redis.exists(f"{self.prefix}:session:{session}") == 1
+
+    async def revoke_session(self, session: str):
+        await self.redis.delete(f"{self.prefix}:session:{session}")
+
+    async def revoke(self, token: str, ttl: int):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(f"{self.prefix}:revoked:{token}", 1, ex=ttl)
+            pipe.publish(f"{self.prefix}:revoked", f"{token} {ttl}")
+            await pipe.execute()
+        self._add(f"revoked:{token}", ttl)
+
+    async def is_revoked(self, token: str) -> bool:
+        if self._watcher is None:
+            self._watcher = asyncio.create_task(self._watch())
+        if self._synced.is_set():
+            return self._valid(f"revoked:{token}")
+        return await self.redis.exists(f"{self.prefix}:revoked:{token}") == 1
+
+    async def _load_revoked(self):
+        keys = [key async for key in self.redis.scan_iter(match=f"{self.prefix}:revoked:*")]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.pttl(key)
+            ttls = await pipe.execute()
+        for key, ttl in zip(keys, ttls):
+            # keys that expired since the scan have a negative TTL
+            if ttl > 0:
+                self._add(f"revoked:{key.decode().removeprefix(f'{self.prefix}:revoked:')}", ttl / 1000)
+
+    async def _watch(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    # subscribed before loading, so that no revocation falls in between
+                    await pubsub.subscribe(f"{self.prefix}:revoked")
+                    await self._load_revoked()
+                    self._synced.set()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            token, ttl = message["data"].decode().split(" ")
+                            self._add(f"revoked:{token}", int(ttl))
+            except Exception as e:
+                self._synced.clear()
+                logger.error(f"Lost the session revocation subscription: {e!r}")
+                await asyncio.sleep(1)
+
+
+class SignedSessionStore(SessionStore):
+    """
+    Stateless session tokens on top of another store, which keeps the OTPs
+    and the revocation list.
+
+    A session is `<expiry>.<nonce>.<signature>`, signed with HMAC-SHA256, so
+    validating one is a constant-time comparison plus a revocation lookup,
+    with nothing stored per session. Logged out sessions are put on the
+    other store's revocation list until they expire, so with the Redis
+    backend a logout applies to every worker; that store keeps the list in
+    memory too, so the lookup stays in-process.
+    """
+
+    def __init__(self, store: SessionStore, secret: str):
+        super().__init__()
+        self.store = store
+        self._key = secret.encode("utf-8")
+
+    def _sign(self, payload: str) -> str:
+        digest = hmac.new(self._key, payload.encode("utf-8"), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+    async def issue_otp(self, ttl: int) -> str:
+        return await self.store.issue_otp(ttl)
+
+    async def consume_otp(self, token: str) -> bool:
+        return await self.store.consume_otp(token)
+
+    async def create_session(self, ttl: int) -> str:
+        payload = f"{int(time.time()) + ttl}.{secrets.token_urlsafe(12)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def _verify(self, session: str) -> tuple[int, str] | None:
+        payload, _, signature = session.rpartition(".")
+        expiry, _, nonce = payload.partition(".")
+        if not nonce or not hmac.compare_digest(signature.encode("utf-8"), self._sign(payload).encode("utf-8")):
+            return None
+        try:
+            return int(expiry), nonce
+        except ValueError:
+            return None
+
+    async def validate_session(self, session: str) -> bool:
+        verified = self._verify(session)
+        if verified is None or verified[0] <= time.time():
+            return False
+        return not await self.store.is_revoked(verified[1])
+
+    async def revoke_session(self, session: str):
+        verified = self._verify(session)
+        if verified is not None and verified[0] > time.time():
+            await self.store.revoke(verified[1], int(verified[0] - time.time()) + 1)
+
+
+def create_session_store() -> SessionStore:
+    if settings.session_backend == "redis":
+        store = RedisSessionStore(create_redis(), prefix=f"{settings.cache_prefix}:sessions")
+    elif settings.session_backend == "memory":
+        store = SessionStore()
+    else:
+        raise ValueError(f"Unsupported session backend: {settings.session_backend}")
+    if not settings.signed_sessions:
+        return store
+    if not settings.session_secret:
+        # every worker has to verify the sessions the others sign
+        raise ValueError("SIGNED_SESSIONS needs a SESSION_SECRET")
+    return SignedSessionStore(store, settings.session_secret)
+
+
+sessions = create_session_store()
@@ -0,0 +1,146 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from dataclasses import dataclass, field
+
+from fastapi import Request, HTTPException
+from starlette.responses import Response, FileResponse
+
+from app.core.logger import logger
+from app.core.config import get_settings
+
+try:
+    import brotli
+except ImportError:  # optional; without it only existing .br files are served
+    brotli = None
+
+settings = get_settings()
+
+# Vite names build output `assets/<name>-<8 character hash>.<ext>`
+HASHED_ASSET = re.compile(r"^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+# smaller bodies are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+SIDECARS = {".br": "br", ".gz": "gzip"}
+
+
+def etag_of(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def _accepted_encodings(request: Request) -> set[str]:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+@dataclass
+class Representation:
+    """One encoding of an asset: a file on disk, or bytes compressed at startup."""
+
+    etag: str
+    path: Path | None = None
+    stat: os.stat_result | None = None
+    body: bytes | None = None
+
+
+@dataclass
+class Asset:
+    media_type: str
+    cache_control: str
+    # encoding ("identity", "br" or "gzip") -> representation
+    variants: dict[str, Representation] = field(default_factory=dict)
+
+
+class StaticAssets:
+    """
+    An index of the files under a directory, built once.
+
+    Every file is hashed into a strong ETag up front. Compressible files get
+    gzip (and, when `brotli` is installed, brotli) variants: prebuilt `.gz`/
+    `.br` files next to them are used as they are, otherwise the variants are
+    compressed into memory. Requests are answered from the index alone, so a
+    new build needs a restart to be picked up.
+    """
+
+    def __init__(self, directory: str | Path, fallback: str = "index.html"):
+        self.directory = Path(directory)
+        self.files: dict[str, Asset] = {}
+        if self.directory.is_dir():
+            self._scan()
+        self.fallback = self.files.get(fallback)
+
+    def _scan(self):
+        for root, _dirs, names in os.walk(self.directory):
+            for name in names:
+                path = Path(root, name)
+                suffix = path.suffix
+                if suffix in SIDECARS and path.with_suffix("").is_file():
+                    continue
+                key = path.relative_to(self.directory).as_posix()
+                self.files[key] = self._load(key, path)
+
+    @staticmethod
+    def _load(key: str, path: Path) -> Asset:
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        body = path.read_bytes()
+        etag = etag_of(body)
+        asset = Asset(media_type, IMMUTABLE if HASHED_ASSET.match(key) else REVALIDATE,
+                      {"identity": Representation(etag, path=path, stat=path.stat())})
+        for suffix, encoding in SIDECARS.items():
+            sidecar = Path(f"{path}{suffix}")
+            if sidecar.is_file():
+                asset.variants[encoding] = Representation(f'{etag[:-1]}-{encoding}"', path=sidecar,
+                                                          stat=sidecar.stat())
+        if len(body) >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE):
+            if "gzip" not in asset.variants:
+                asset.variants["gzip"] = Representation(f'{etag[:-1]}-gzip"',
+                                                        body=gzip.compress(body, compresslevel=9, mtime=0))
+            if "br" not in asset.variants and brotli is not None:
+                asset.variants["br"] = Representation(f'{etag[:-1]}-br"', body=brotli.compress(body))
+        return asset
+
+    def respond(self, request: Request, path: str) -> Response:
+        asset = self.files.get(path) or self.fallback
+        if asset is None:
+            raise HTTPException(status_code=404)
+
+        encoding = "identity"
+        if len(asset.variants) > 1:
+            accepted = _accepted_encodings(request)
+            encoding = next((e for e in ("br", "gzip") if e in accepted and e in asset.variants), "identity")
+        representation = asset.variants[encoding]
+
+        headers = {"ETag": representation.etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        if not_modified(request, representation.etag):
+            return Response(status_code=304, headers=headers)
+        if representation.body is not None:
+            return Response(representation.body, media_type=asset.media_type, headers=headers)
+        return FileResponse(representation.path, stat_result=representation.stat, media_type=asset.media_type,
+                            headers=headers)
+
+
+def create_static_assets() -> StaticAssets:
+    assets = StaticAssets(settings.public_dir)
+    logger.info(f"Indexed {len(assets.files)} static assets")
+    return assets
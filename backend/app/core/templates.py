@@ -1,11 +1,17 @@
+import json
+import time
+import mimetypes
 from pathlib import Path
+from collections.abc import Callable
 
 from fastapi import FastAPI, Request, Depends
+from starlette.responses import Response
 from fastapi.templating import Jinja2Templates
 
 from app.core.logger import logger
 from app.core.auth import cookie_scheme
 from app.core.config import get_settings
+from app.core.static import REVALIDATE, etag_of, not_modified
 
 settings = get_settings()
 
@@ -24,9 +30,72 @@ context = {
 }
 
 
+# how often, in seconds, a template file is checked for changes
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class RenderedPage:
+    """
+    A page rendered once into bytes with a strong ETag.
+
+    If the page comes from a `source` file, that file's mtime is checked at
+    most once every `RELOAD_CHECK_INTERVAL` seconds and the page re-rendered
+    when it changes.
+    """
+
+    def __init__(self, render: Callable[[], str], media_type: str, source: Path | None = None):
+        self.render = render
+        self.media_type = media_type
+        self.source = source
+        self._mtime: int | None = None
+        self._checked = time.monotonic()
+        if source is not None:
+            self._mtime = source.stat().st_mtime_ns
+        self._load()
+
+    def _load(self):
+        self.body = self.render().encode("utf-8")
+        self.etag = etag_of(self.body)
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self.source is None or now - self._checked < RELOAD_CHECK_INTERVAL:
+            return
+        self._checked = now
+        try:
+            mtime = self.source.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._mtime = mtime
+            self._load()
+            logger.info(f"Re-rendered {self.source.name}")
+
+    def respond(self, request: Request) -> Response:
+        self._reload_if_changed()
+        headers = {"ETag": self.etag, "Cache-Control": REVALIDATE}
+        if not_modified(request, self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(self.body, media_type=self.media_type, headers=headers)
+
+
+def render_template(name: str) -> str:
+    return templates.get_template(name).render(context)
+
+
+def render_env() -> str:
+    return "window._env_ = " + json.dumps(context) + ";"
+
+
+env_js = RenderedPage(render_env, "application/javascript")
+
+
 def make_view(name: str):
+    page = RenderedPage(lambda: render_template(name), mimetypes.guess_type(Path(name).stem)[0] or "text/html",
+                        source=TEMPLATES_DIR / name)
+
     async def view(request: Request, _auth: str = Depends(cookie_scheme)):
-        return templates.TemplateResponse(name=name, request=request, context=context)
+        return page.respond(request)
 
     view.__name__ = f"view_{name.replace(".", "_")}"
     return view
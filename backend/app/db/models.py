@@ -1,6 +1,8 @@
 from sqlalchemy import Column, String
+from sqlalchemy.orm import declarative_base
 
-from app.db.session import Base
+# defined apart from the engine, so that importing the models does not create it
+Base = declarative_base()
 
 
 class DictMixin:
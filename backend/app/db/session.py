@@ -1,15 +1,97 @@
+import time
+import contextlib
 from collections.abc import AsyncGenerator
 
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
+from prometheus_client import Counter, Gauge, Histogram
 
 from app.core.config import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(settings.database_url)
+pool_checkouts = Counter("db_pool_checkouts_total", "Connections checked out of the database pool")
+pool_checked_out = Gauge("db_pool_checked_out", "Connections currently checked out of the database pool")
+pool_wait = Histogram("db_pool_wait_seconds", "Time spent waiting for a connection from the database pool",
+                      buckets=[0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5])
+query_duration = Histogram("db_query_duration_seconds", "Duration of database statements",
+                           buckets=[0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1])
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - start)
+
+
+def _engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # in-memory SQLite lives in a single connection, so there is no pool to size
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+
+engine = create_async_engine(settings.database_url, **_engine_options(settings.database_url))
 session_factory = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _on_connect(dbapi_connection, _record):
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers carry on while a write is in progress
+    cursor.execute(f"PRAGMA journal_mode={settings.db_sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.db_sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.db_sqlite_busy_timeout)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.db_sqlite_mmap_size)}")
+    cursor.close()
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _on_checkout(*_args):
+    pool_checkouts.inc()
+    pool_checked_out.inc()
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _on_checkin(*_args):
+    pool_checked_out.dec()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+    query_duration.observe(time.perf_counter() - conn.info["query_start"].pop())
+
+
+async def prewarm(connections: int):
+    """Open `connections` pooled connections up front, so the first requests do not pay for them."""
+    if not isinstance(engine.pool, InstrumentedQueuePool):
+        return
+    # held together, so that each one is a new connection rather than the last one handed back
+    async with contextlib.AsyncExitStack() as stack:
+        for _ in range(min(connections, settings.db_pool_size + max(settings.db_max_overflow, 0))):
+            await stack.enter_async_context(engine.connect())
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
@@ -17,4 +99,4 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     try:
         yield session
     finally:
-        await session.close()
\ No newline at end of file
+        await session.close()
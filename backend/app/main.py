@@ -1,11 +1,7 @@
-import json
-from pathlib import Path
-
 import uvicorn
 from fastapi.routing import APIRoute
-from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi import Request, FastAPI, Response, HTTPException
+from fastapi import Request, FastAPI
 
 from app.app import app
 from app.db import configure_db
@@ -15,9 +11,11 @@ from app.core.config import get_settings
 from app.core.cors import configure_cors
 from app.core import schemas, downgrade_ssl
 from app.core.metrics import configure_metrics
+from app.core.profiler import configure_profiler
 from app.core.schemas import configure_schemas
 from app.core.sockets import configure_sockets
-from app.core.templates import configure_templates
+from app.core.static import create_static_assets
+from app.core.templates import env_js, configure_templates
 from app.api.v1.sockets import configure_v1_namespace
 from app.core.rate_limiter import limiter, configure_limiter
 
@@ -26,9 +24,10 @@ settings = get_settings()
 if settings.downgrade_ssl:
     downgrade_ssl()
 
-configure_limiter()
+configure_limiter(app)
 configure_cors()
 configure_metrics()
+configure_profiler(app)
 configure_auth()
 configure_db()
 configure_schemas()
@@ -50,32 +49,17 @@ async def get_status(request: Request) -> schemas.Status:
 
 @app.get("/env.js")
 async def get_env(request: Request):
-    env = {
-        "VITE_APP_TITLE": settings.app_name,
-        "VITE_BACKEND": settings.vite_backend,
-        "VITE_SOCKET_SERVER": settings.vite_socket_server,
-        "VITE_SOCKET_PATH": settings.vite_socket_path,
-        "VITE_LOG_LEVEL": settings.log_level,
-        "VITE_LOGGING_SERVER": settings.logging_server,
-        "VITE_ENABLE_DEBUG": settings.vite_enable_debug,
-    }
-    payload = "window._env_ = " + json.dumps(env) + ";"
-    return Response(payload, media_type="application/javascript")
+    return env_js.respond(request)
 
 
 app.mount("/asyncapi", StaticFiles(directory=settings.asyncapi_dir), name="asyncapi")
 
+static_assets = create_static_assets()
+
 
 @app.get("/{full_path:path}")
-async def spa(full_path: str):
-    print(full_path)
-    file_path = Path(settings.public_dir, full_path)
-    if file_path.is_file():
-        return FileResponse(file_path)
-    index = Path(settings.public_dir, "index.html")
-    if index.is_file():
-        return FileResponse(index)
-    raise HTTPException(status_code=404)
+async def spa(full_path: str, request: Request):
+    return static_assets.respond(request, full_path)
 
 
 def use_route_names_as_operation_ids(app_: FastAPI) -> None:
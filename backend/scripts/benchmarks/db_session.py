@@ -0,0 +1,97 @@
+"""
+Measure `/auth/token` under concurrent load, with API key caching disabled so
+that every request checks the key in the database.
+
+Runs the app in-process through an ASGI transport against a throwaway SQLite
+database (or DATABASE_URL with `--database-url`), and reports requests per
+second and latency percentiles for each concurrency level, with the pool wait
+and query latency recorded by the DB layer's metrics.
+
+Usage: uv run scripts/benchmarks/db_session.py --requests 2000 --concurrency 1 16 64
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+API_KEY = "benchmark-key"
+
+
+def percentiles(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {f"p{q}_ms": round(ordered[min(len(ordered) - 1, len(ordered) * q // 100)] * 1000, 3)
+            for q in (50, 90, 99)}
+
+
+def histogram_mean(histogram) -> float | None:
+    samples = {s.name: s.value for s in histogram.collect()[0].samples if not s.labels.get("le")}
+    count = next((v for k, v in samples.items() if k.endswith("_count")), 0)
+    total = next((v for k, v in samples.items() if k.endswith("_sum")), 0)
+    return round(total / count * 1e6, 1) if count else None
+
+
+async def measure(client: httpx.AsyncClient, requests: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.get("/auth/token", headers={"Authorization": f"Bearer {API_KEY}"})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"requests_per_s": round(requests / (time.perf_counter() - start), 1), **percentiles(latencies)}
+
+
+async def run(args) -> dict:
+    # settings are read on import, so the environment has to be in place first
+    os.environ.update(DISABLE_AUTH="false", CACHE_ENABLED="false", API_KEY_CACHE_TTL="0",
+                      DATABASE_URL=args.database_url)
+    from app.main import app
+    from app.db.models import APIKey, Base
+    from app.db.session import engine, session_factory, pool_wait, query_duration
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with session_factory() as db:
+        await db.merge(APIKey(id=API_KEY))
+        await db.commit()
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for concurrency in args.concurrency:
+                results[concurrency] = await measure(client, args.requests, concurrency)
+    results["pool_wait_mean_us"] = histogram_mean(pool_wait)
+    results["query_mean_us"] = histogram_mean(query_duration)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        args.database_url = args.database_url or f"sqlite+aiosqlite:///{directory}/benchmark.db"
+        results = asyncio.run(run(args))
+    print(json.dumps({"requests": args.requests, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
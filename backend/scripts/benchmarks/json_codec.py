@@ -0,0 +1,75 @@
+"""
+Measure encode and decode time for the payloads that cross the socket server
+and the response cache, comparing the previous stdlib path
+(`jsonable_encoder` + `json.dumps`, `json.loads` of decoded text) with each
+available codec.
+
+Usage: uv run scripts/benchmarks/json_codec.py --calls 100000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.core import codec, schemas
+
+
+def legacy_dumps(value) -> bytes:
+    return json.dumps(jsonable_encoder(value)).encode("utf-8")
+
+
+def legacy_loads(data: bytes):
+    return json.loads(data.decode("utf-8"))
+
+
+PAYLOADS = {
+    "TickPayload": schemas.TickPayload(timestamp="2024-01-01T00:00:00+00:00"),
+    "GetStatePayload": schemas.GetStatePayload(
+        status="running",
+        timestamp="2024-01-01T00:00:00+00:00",
+        text="hello world",
+        arc_width=2.5,
+        select_county_event=schemas.SelectCountyBroadcastPayload(county_id="36061", animation_start_time=1704067200),
+    ),
+}
+
+
+def measure(fn, value, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn(value)
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def run(calls: int) -> dict:
+    codecs = {"legacy": (legacy_dumps, legacy_loads)}
+    codecs.update((name, pair) for name, pair in codec._codecs.items() if pair[1] is not None)
+    results = {}
+    for name, payload in PAYLOADS.items():
+        encoded = legacy_dumps(payload)
+        rows = {}
+        for codec_name, (dumps, loads) in codecs.items():
+            rows[codec_name] = {"encode_ns": round(measure(dumps, payload, calls)),
+                                "decode_ns": round(measure(loads, encoded, calls))}
+        for codec_name, row in rows.items():
+            if codec_name != "legacy":
+                row["encode_speedup"] = round(rows["legacy"]["encode_ns"] / row["encode_ns"], 2)
+                row["decode_speedup"] = round(rows["legacy"]["decode_ns"] / row["decode_ns"], 2)
+        results[name] = {"bytes": len(encoded), **rows}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps({"calls": args.calls, "payloads": run(args.calls)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+End-to-end load test of the socket server through `/v1`.
+
+Starts `app.main:app` on a local port (or in this process with `--in-process`,
+or uses a running server with `--url`), connects `--clients` socket.io clients
+spread over `--rooms` rooms and reports, as JSON:
+
+- connect rate and connect latency percentiles
+- `get_state` ack latency percentiles
+- `select_county` broadcast delivery latency percentiles, from the sender's
+  emit to each member of its room receiving it
+- tick jitter: how far apart consecutive `tick`s arrive, compared with INTERVAL
+- server CPU and resident memory (read from /proc, so Linux only)
+
+The server runs with auth disabled and the in-memory state store and client
+manager, so nothing but the machine itself is needed; `--redis` switches both
+to the Redis at CACHE_HOST. The rest of the configuration comes from `.env`.
+
+The socket.io client needs aiohttp, which the app itself does not depend on,
+hence `--with aiohttp`.
+
+Usage: uv run --with aiohttp scripts/benchmarks/load_test.py --clients 200 --rooms 10 --ticks 5
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import subprocess
+
+import socketio
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..", "..")
+NAMESPACE = "/v1"
+SOCKET_PATH = "/ws/socket.io"
+
+sys.path.append(BACKEND_DIR)
+
+
+def percentiles(values: list[float]) -> dict | None:
+    """p50/p90/p99/max of a list of seconds, in milliseconds."""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"count": len(ordered), "p50_ms": at(0.5), "p90_ms": at(0.9), "p99_ms": at(0.99),
+            "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+class ProcessSampler:
+    """Samples a process's CPU time and resident memory from /proc every `period` seconds."""
+
+    def __init__(self, pid: int, period: float = 0.5):
+        self.pid = pid
+        self.period = period
+        self.cpu: list[float] = []
+        self.rss: list[int] = []
+        self._ticks = os.sysconf("SC_CLK_TCK")
+        self._task: asyncio.Task | None = None
+
+    def _read(self) -> tuple[float, int] | None:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                # the command name may contain spaces, so split after its closing parenthesis
+                stat = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/status") as f:
+                rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            return None
+        return (int(stat[11]) + int(stat[12])) / self._ticks, rss * 1024
+
+    async def _run(self):
+        previous, stamp = self._read(), time.monotonic()
+        while previous is not None:
+            await asyncio.sleep(self.period)
+            current, now = self._read(), time.monotonic()
+            if current is None:
+                return
+            self.cpu.append((current[0] - previous[0]) / (now - stamp) * 100)
+            self.rss.append(current[1])
+            previous, stamp = current, now
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> dict | None:
+        if self._task is not None:
+            self._task.cancel()
+        if not self.cpu:
+            return None
+        return {"cpu_percent_mean": round(sum(self.cpu) / len(self.cpu), 1),
+                "cpu_percent_max": round(max(self.cpu), 1),
+                "rss_mb_max": round(max(self.rss) / 2 ** 20, 1)}
+
+
+def server_env(args) -> dict[str, str]:
+    env = {
+        "DISABLE_AUTH": "true",
+        "BASE_PATH": "",
+        "INTERVAL": str(args.tick_interval),
+    }
+    if args.redis:
+        env.update(STATE_BACKEND="redis", SOCKET_MANAGER="redis", SOCKET_RATE_LIMIT_BACKEND="redis",
+                   CACHE_HOST=args.redis, CACHE_ENABLED="true")
+    else:
+        env.update(STATE_BACKEND="memory", SOCKET_MANAGER="local", SOCKET_RATE_LIMIT_BACKEND="memory",
+                   CACHE_ENABLED="false")
+    return env
+
+
+async def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"The server did not start listening on port {port}")
+            await asyncio.sleep(0.1)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(args):
+    """Returns the server URL, its pid (or None when it is not local) and a coroutine function that stops it."""
+    if args.url:
+        async def stop():
+            pass
+        return args.url, None, stop
+
+    port = free_port()
+    if args.in_process:
+        # settings are read on import, so the environment has to be in place first
+        os.environ.update(server_env(args))
+        import uvicorn
+        from app.main import app
+
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        task = asyncio.create_task(server.serve())
+        await wait_for_port(port)
+
+        async def stop():
+            server.should_exit = True
+            await task
+        return f"http://127.0.0.1:{port}", os.getpid(), stop
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**os.environ, **server_env(args)})
+    await wait_for_port(port)
+
+    async def stop():
+        process.terminate()
+        await asyncio.to_thread(process.wait)
+    return f"http://127.0.0.1:{port}", process.pid, stop
+
+
+class LoadClient:
+    """One socket.io client in a room, recording when broadcasts reach it."""
+
+    def __init__(self, room: str, received: dict[str, list[float]]):
+        self.room = room
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.ticks: list[float] = []
+        self.sio.on("tick", self._on_tick, namespace=NAMESPACE)
+        self.sio.on("select_county", self._on_select_county, namespace=NAMESPACE)
+        self.sio.on("state_patch", self._on_state_patch, namespace=NAMESPACE)
+        self._received = received
+
+    async def _on_tick(self, _data):
+        self.ticks.append(time.perf_counter())
+
+    async def _on_select_county(self, data):
+        self._received.setdefault(data["county_id"], []).append(time.perf_counter())
+
+    async def _on_state_patch(self, data):
+        # with STATE_SYNC=patches the selection arrives as a patch instead
+        event = data["patch"].get("select_county_event")
+        if event is not None:
+            await self._on_select_county(event)
+
+    async def connect(self, url: str) -> float:
+        start = time.perf_counter()
+        await self.sio.connect(f"{url}?room={self.room}", namespaces=[NAMESPACE], socketio_path=SOCKET_PATH,
+                               transports=["websocket"])
+        return time.perf_counter() - start
+
+
+async def connect_all(clients: list[LoadClient], url: str, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def connect(client: LoadClient):
+        nonlocal failures
+        async with semaphore:
+            try:
+                latencies.append(await client.connect(url))
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(client) for client in clients))
+    elapsed = time.perf_counter() - start
+    return {"connected": len(latencies), "failed": failures,
+            "connects_per_s": round(len(latencies) / elapsed, 1), "latency": percentiles(latencies)}
+
+
+async def measure_get_state(clients: list[LoadClient], calls: int) -> dict:
+    latencies: list[float] = []
+
+    async def call(client: LoadClient):
+        for _ in range(calls):
+            start = time.perf_counter()
+            await client.sio.call("get_state", namespace=NAMESPACE, timeout=30)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call(client) for client in clients))
+    return {"calls_per_s": round(len(latencies) / (time.perf_counter() - start), 1),
+            "latency": percentiles(latencies)}
+
+
+async def measure_broadcasts(rooms: dict[str, list[LoadClient]], received: dict[str, list[float]],
+                             rounds: int, spacing: float) -> dict:
+    sent: dict[str, tuple[float, int]] = {}
+    for round_ in range(rounds):
+        for room, members in rooms.items():
+            county_id = f"{room}:{round_}"
+            sent[county_id] = (time.perf_counter(), len(members))
+            await members[0].sio.emit("select_county", {"county_id": county_id}, namespace=NAMESPACE)
+        # stays under the per-socket select_county rate limit
+        await asyncio.sleep(spacing)
+    await asyncio.sleep(1)
+    latencies = [arrival - start for county_id, (start, _) in sent.items() for arrival in received.get(county_id, [])]
+    expected = sum(members for _, members in sent.values())
+    return {"expected": expected, "delivered": len(latencies), "latency": percentiles(latencies)}
+
+
+async def measure_ticks(rooms: dict[str, list[LoadClient]], ticks: int, interval: float) -> dict:
+    for members in rooms.values():
+        await members[0].sio.emit("start", namespace=NAMESPACE)
+    await asyncio.sleep(interval * (ticks + 0.5))
+    for members in rooms.values():
+        await members[0].sio.emit("stop", namespace=NAMESPACE)
+    jitter = [abs((b - a) - interval) for members in rooms.values() for client in members
+              for a, b in zip(client.ticks, client.ticks[1:])]
+    return {"interval_s": interval, "received": sum(len(c.ticks) for m in rooms.values() for c in m),
+            "jitter": percentiles(jitter)}
+
+
+async def run(args) -> dict:
+    url, pid, stop = await start_server(args)
+    sampler = ProcessSampler(pid) if pid is not None else None
+    if sampler is not None:
+        sampler.start()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    received: dict[str, list[float]] = {}
+    rooms: dict[str, list[LoadClient]] = {f"load-{i}": [] for i in range(args.rooms)}
+    clients = []
+    for i in range(args.clients):
+        room = f"load-{i % args.rooms}"
+        client = LoadClient(room, received)
+        rooms[room].append(client)
+        clients.append(client)
+    rooms = {room: members for room, members in rooms.items() if members}
+
+    results = {}
+    try:
+        results["connect"] = await connect_all(clients, url, args.concurrency)
+        connected = [client for client in clients if client.sio.connected]
+        rooms = {room: [c for c in members if c.sio.connected] for room, members in rooms.items()}
+        rooms = {room: members for room, members in rooms.items() if members}
+        results["get_state"] = await measure_get_state(connected, args.calls)
+        results["select_county"] = await measure_broadcasts(rooms, received, args.broadcasts, args.spacing)
+        if args.ticks:
+            results["tick"] = await measure_ticks(rooms, args.ticks, args.tick_interval)
+    finally:
+        await asyncio.gather(*(client.sio.disconnect() for client in clients if client.sio.connected))
+        if sampler is not None:
+            results["server"] = sampler.stop()
+        await stop()
+    if args.in_process:
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        # clients and server share the process, so this is an upper bound on the server's share
+        results["process_cpu_s"] = round(after.ru_utime + after.ru_stime - usage.ru_utime - usage.ru_stime, 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=50, help="connects in flight at once")
+    parser.add_argument("--calls", type=int, default=20, help="get_state calls per client")
+    parser.add_argument("--broadcasts", type=int, default=10, help="select_county rounds per room")
+    parser.add_argument("--spacing", type=float, default=0.25, help="seconds between select_county rounds")
+    parser.add_argument("--ticks", type=int, default=5, help="ticks to wait for per room (0 skips)")
+    parser.add_argument("--tick-interval", type=int, default=1, help="INTERVAL for a server started here")
+    parser.add_argument("--redis", metavar="HOST", help="share state and emits through the Redis at HOST")
+    parser.add_argument("--url", help="test a server that is already running (and configured) instead")
+    parser.add_argument("--in-process", action="store_true", help="run the server in this process")
+    args = parser.parse_args()
+    config = {k: v for k, v in vars(args).items() if v is not None}
+    print(json.dumps({"config": config, "results": asyncio.run(run(args))}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
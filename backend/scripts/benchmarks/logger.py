@@ -0,0 +1,104 @@
+"""
+Measure logging calls per second at an enabled and a disabled level, comparing
+the previous synchronous `Logger._log` (label, timestamp and message built and
+written on the caller's thread) with the queued `Logger`.
+
+Output goes to /dev/null. For the queued logger, `caller` counts calls the
+caller can make per second and `end_to_end` also waits for every record to be
+written by the listener thread.
+
+Usage: uv run scripts/benchmarks/logger.py --calls 100000
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.core.config import get_settings
+from app.core.logger import Logger, LogLevels, hex_to_rgb, APP_LOG_ID_WIDTH
+
+settings = get_settings()
+
+# the lowest (most severe) level still shown is `threshold`, so DEBUG is hidden
+THRESHOLD = 5
+
+
+class LegacyLogger:
+    """The previous implementation, without the logging server."""
+
+    def __init__(self, stream, threshold: int):
+        self.threshold = threshold
+        self.logger = logging.getLogger("benchmark-legacy")
+        self.logger.propagate = False
+        self.logger.setLevel(1)
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.logger.addHandler(handler)
+
+    @staticmethod
+    def _get_ansi_label(lvl):
+        bg_r, bg_g, bg_b = hex_to_rgb(lvl["label"]["bgColor"])
+        fg_r, fg_g, fg_b = hex_to_rgb(lvl["label"]["color"])
+        esc = "\033["
+        return lambda text: f"{esc}48;2;{bg_r};{bg_g};{bg_b}m{esc}38;2;{fg_r};{fg_g};{fg_b}m{esc}1m{text}{esc}0m"
+
+    def _log(self, lvl, *args):
+        if self.threshold > lvl["level"]:
+            return
+        whitespace = " " if len(lvl["name"]) == 4 else ""
+        log_label = self._get_ansi_label(lvl)(f"[{lvl['name']}]")
+        now = datetime.datetime.now().strftime("%d/%m/%Y, %H:%M:%S")
+        parts = [whitespace + log_label, now, "-", settings.app_name.ljust(APP_LOG_ID_WIDTH) + ":"]
+        parts.extend(str(a) for a in args)
+        self.logger.log(logging.INFO, " ".join(parts))
+
+    def trace(self, *args):
+        self._log(LogLevels["trace"], *args)
+
+    def debug(self, *args):
+        self._log(LogLevels["debug"], *args)
+
+
+def measure(log, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        log("Emitted tick", {"room": "display-1"}, i)
+    return time.perf_counter() - start
+
+
+def run(calls: int) -> dict:
+    with open(os.devnull, "w") as devnull:
+        legacy = LegacyLogger(devnull, THRESHOLD)
+        queued = Logger("benchmark-queued", stdout=devnull, stderr=devnull)
+        queued.set_level(THRESHOLD)
+
+        results = {"disabled": {"legacy_per_s": round(calls / measure(legacy.debug, calls)),
+                                "queued_per_s": round(calls / measure(queued.debug, calls))}}
+        legacy_elapsed = measure(legacy.trace, calls)
+        caller_elapsed = measure(queued.trace, calls)
+        start = time.perf_counter()
+        queued.close()
+        drained = time.perf_counter() - start
+        results["enabled"] = {"legacy_per_s": round(calls / legacy_elapsed),
+                              "queued_caller_per_s": round(calls / caller_elapsed),
+                              "queued_end_to_end_per_s": round(calls / (caller_elapsed + drained))}
+    for row in results.values():
+        queued_key = "queued_per_s" if "queued_per_s" in row else "queued_caller_per_s"
+        row["speedup"] = round(row[queued_key] / row["legacy_per_s"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100_000)
+    args = parser.parse_args()
+    print(json.dumps({"calls": args.calls, "levels": run(args.calls)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measure the cost of broadcasting a `tick` to one room, comparing the stock
+client manager (model dumped per emit, one task per recipient) with the
+`BroadcastManager` (model encoded as it is, written to each recipient in
+turn). `stock_us` is the stock manager given the model as well, which
+isolates the cost of the per-recipient tasks; both managers encode the
+packet once per emit.
+
+Sockets are in-memory stand-ins that only encode the packet they are given,
+so the numbers cover serialisation and fan-out, not network I/O.
+
+Usage: uv run scripts/benchmarks/room_fanout.py --members 1 100 5000 --emits 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from datetime import datetime, timezone
+
+import socketio
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.core import codec, schemas
+from app.core.sockets import BroadcastManager
+
+NAMESPACE = "/v1"
+ROOM = "room"
+
+
+class FakeSocket:
+    """Stands in for an Engine.IO socket; encodes what it is sent, as a transport would."""
+
+    def __init__(self):
+        self.closed = False
+        self.sent = 0
+
+    async def send(self, pkt):
+        pkt.encode()
+        self.sent += 1
+
+
+async def build_server(manager: socketio.AsyncManager, members: int) -> socketio.AsyncServer:
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=manager, json=codec.SocketJson)
+    manager.initialize()
+    for i in range(members):
+        eio_sid = f"eio{i}"
+        server.eio.sockets[eio_sid] = FakeSocket()
+        sid = await manager.connect(eio_sid, NAMESPACE)
+        await manager.enter_room(sid, NAMESPACE, ROOM)
+    return server
+
+
+async def legacy_emit(server: socketio.AsyncServer):
+    data = schemas.TickPayload(timestamp=datetime.now(tz=timezone.utc).isoformat())
+    await server.emit("tick", data.model_dump(), room=ROOM, namespace=NAMESPACE)
+
+
+async def broadcast_emit(server: socketio.AsyncServer):
+    data = schemas.TickPayload(timestamp=datetime.now(tz=timezone.utc).isoformat())
+    await server.emit("tick", data, room=ROOM, namespace=NAMESPACE)
+
+
+async def measure(server: socketio.AsyncServer, emit, emits: int) -> float:
+    await emit(server)  # warm up
+    start = time.perf_counter()
+    for _ in range(emits):
+        await emit(server)
+    return (time.perf_counter() - start) / emits * 1e6
+
+
+async def run(members: list[int], emits: int) -> dict:
+    results = {}
+    for count in members:
+        before = await measure(await build_server(socketio.AsyncManager(), count), legacy_emit, emits)
+        stock = await measure(await build_server(socketio.AsyncManager(), count), broadcast_emit, emits)
+        after = await measure(await build_server(BroadcastManager(), count), broadcast_emit, emits)
+        results[count] = {"before_us": round(before, 1), "stock_us": round(stock, 1), "after_us": round(after, 1),
+                          "before_per_member_ns": round(before * 1000 / count),
+                          "after_per_member_ns": round(after * 1000 / count),
+                          "speedup": round(before / after, 2),
+                          "fanout_speedup": round(stock / after, 2)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, nargs="+", default=[1, 100, 5000])
+    parser.add_argument("--emits", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps({"emits": args.emits, "members": asyncio.run(run(args.members, args.emits))}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
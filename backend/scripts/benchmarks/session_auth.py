@@ -0,0 +1,62 @@
+"""
+Measure socket handshake authentication throughput, comparing validation of a
+session cookie against a session store with verification of a signed session.
+
+Each handshake parses the cookie header, as `authenticate` does, then
+validates the session. `--redis` adds the Redis session store at CACHE_HOST,
+which costs a round trip per handshake, and signed sessions on top of it,
+which check their revocation list in memory once it is loaded.
+
+Usage: uv run scripts/benchmarks/session_auth.py --handshakes 100000 --redis
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.core.cache import create_redis
+from app.core.socket_auth import _get_token_from_environ
+from app.core.state import SessionStore, RedisSessionStore, SignedSessionStore
+
+
+def environ_for(session: str) -> dict:
+    return {"asgi.scope": {"headers": [(b"host", b"localhost"), (b"cookie", f"session={session}".encode())]}}
+
+
+async def measure(store: SessionStore, handshakes: int) -> dict:
+    environ = environ_for(await store.create_session(3600))
+    start = time.perf_counter()
+    for _ in range(handshakes):
+        assert await store.validate_session(_get_token_from_environ(environ))
+    elapsed = time.perf_counter() - start
+    return {"handshakes_per_s": round(handshakes / elapsed), "per_handshake_us": round(elapsed / handshakes * 1e6, 2)}
+
+
+async def run(handshakes: int, redis: bool) -> dict:
+    stores = {"memory_store": SessionStore(),
+              "signed": SignedSessionStore(SessionStore(), secret="benchmark")}
+    if redis:
+        stores["redis_store"] = RedisSessionStore(create_redis(), prefix="benchmark:sessions")
+        revocations = RedisSessionStore(create_redis(), prefix="benchmark:sessions")
+        # the first lookup starts loading the revocation list; measure once it has
+        await revocations.is_revoked("")
+        await asyncio.wait_for(revocations._synced.wait(), 5)
+        stores["signed_redis"] = SignedSessionStore(revocations, secret="benchmark")
+    return {name: await measure(store, handshakes) for name, store in stores.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handshakes", type=int, default=100_000)
+    parser.add_argument("--redis", action="store_true", help="also measure the Redis session store at CACHE_HOST")
+    args = parser.parse_args()
+    print(json.dumps({"handshakes": args.handshakes, "modes": asyncio.run(run(args.handshakes, args.redis))},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the JSON and MessagePack socket.io wire formats (SOCKET_SERIALIZER)
+on the payloads of the high-rate events: bytes per packet, and the time to
+encode a packet (once per emit) and to decode one (once per received event).
+
+Sizes are of the socket.io packet; over WebSocket both formats add the same
+Engine.IO framing, while HTTP long-polling base64-encodes binary packets.
+
+Usage: uv run scripts/benchmarks/socket_serializer.py --packets 20000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from socketio import packet
+from socketio.msgpack_packet import MsgPackPacket
+
+from app.core import codec, schemas
+
+
+class JsonPacket(packet.Packet):
+    json = codec.SocketJson
+
+
+SERIALIZERS = {
+    "json": JsonPacket,
+    "msgpack": MsgPackPacket.configure(dumps_default=codec.to_builtins),
+}
+
+NOW = datetime.datetime.now(datetime.UTC).isoformat()
+county = schemas.SelectCountyBroadcastPayload(county_id="E06000001", animation_start_time=1760000000000)
+EVENTS = {
+    "tick": schemas.TickPayload(timestamp=NOW),
+    "arc_width_update": schemas.ArcWidthUpdatePayload(arc_width=2.75),
+    "select_county": county,
+    "text_update": schemas.TextUpdatePayload(text="Population change by county, 2011 to 2021"),
+    "state_patch": schemas.StatePatchPayload(from_version=41, to_version=42, patch={"arc_width": 2.75}),
+    "get_state": schemas.GetStatePayload(status="running", timestamp=NOW, text="Population change",
+                                         arc_width=2.75, select_county_event=county, version=42),
+}
+
+
+def measure(packet_class, event: str, payload, packets: int) -> dict:
+    # the server encodes models directly; clients send plain data, which is what is decoded
+    outbound = packet_class(packet.EVENT, namespace="/v1", data=[event, payload])
+    encoded = outbound.encode()
+    inbound = packet_class(packet.EVENT, namespace="/v1", data=[event, payload.model_dump(mode="json")]).encode()
+
+    start = time.perf_counter()
+    for _ in range(packets):
+        outbound.encode()
+    encode = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(packets):
+        packet_class(encoded_packet=inbound)
+    decode = time.perf_counter() - start
+    return {"bytes": len(encoded), "encode_us": round(encode / packets * 1e6, 2),
+            "decode_us": round(decode / packets * 1e6, 2)}
+
+
+def run(packets: int) -> dict:
+    results = {}
+    for event, payload in EVENTS.items():
+        row = {name: measure(packet_class, event, payload, packets) for name, packet_class in SERIALIZERS.items()}
+        row["size_ratio"] = round(row["msgpack"]["bytes"] / row["json"]["bytes"], 2)
+        row["encode_speedup"] = round(row["json"]["encode_us"] / row["msgpack"]["encode_us"], 2)
+        row["decode_speedup"] = round(row["json"]["decode_us"] / row["msgpack"]["decode_us"], 2)
+        results[event] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--packets", type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps({"packets": args.packets, "json_codec": codec.codec_name, "events": run(args.packets)},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
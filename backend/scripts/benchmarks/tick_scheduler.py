@@ -0,0 +1,117 @@
+"""
+Compare the thread-per-room `Interval` that used to drive room ticks against
+the shared `TickScheduler`.
+
+Usage: uv run scripts/benchmarks/tick_scheduler.py --rooms 10000 --duration 10
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+import statistics
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.core.scheduler import TickScheduler
+
+
+class LegacyInterval:
+    """The previous implementation: one OS thread and one event loop per tick."""
+
+    def __init__(self, action, interval):
+        self.interval = interval
+        self.action = action
+        self.stopEvent = threading.Event()
+        thread = threading.Thread(target=self._set_interval)
+        thread.start()
+
+    def _set_interval(self):
+        next_time = time.time() + self.interval
+        while not self.stopEvent.wait(next_time - time.time()):
+            next_time += self.interval
+            asyncio.run(self.action())
+
+    def cancel(self):
+        self.stopEvent.set()
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summarise(lateness: list[float]) -> dict:
+    if not lateness:
+        return {"ticks": 0}
+    lateness = sorted(lateness)
+    return {
+        "ticks": len(lateness),
+        "jitter_p50_ms": lateness[len(lateness) // 2] * 1000,
+        "jitter_p99_ms": lateness[int(len(lateness) * 0.99)] * 1000,
+        "jitter_max_ms": lateness[-1] * 1000,
+        "jitter_stdev_ms": statistics.pstdev(lateness) * 1000,
+    }
+
+
+def make_action(start: float, interval: float, lateness: list[float]):
+    fired = 0
+
+    async def action():
+        nonlocal fired
+        fired += 1
+        lateness.append(max(0.0, time.time() - (start + fired * interval)))
+
+    return action
+
+
+async def run_scheduler(rooms: int, interval: float, duration: float) -> dict:
+    scheduler = TickScheduler()
+    lateness: list[float] = []
+    rss_before = rss_bytes()
+    ticks = []
+    for _ in range(rooms):
+        ticks.append(scheduler.schedule(make_action(time.time(), interval, lateness), interval))
+    threads = threading.active_count()
+    await asyncio.sleep(duration)
+    rss_after = rss_bytes()
+    for tick in ticks:
+        tick.cancel()
+    return {"threads": threads, "rss_delta_mb": (rss_after - rss_before) / 2 ** 20, **summarise(lateness)}
+
+
+def run_legacy(rooms: int, interval: float, duration: float) -> dict:
+    lateness: list[float] = []
+    rss_before = rss_bytes()
+    intervals = [LegacyInterval(make_action(time.time(), interval, lateness), interval) for _ in range(rooms)]
+    threads = threading.active_count()
+    time.sleep(duration)
+    rss_after = rss_bytes()
+    for interval_ in intervals:
+        interval_.cancel()
+    return {"threads": threads, "rss_delta_mb": (rss_after - rss_before) / 2 ** 20, **summarise(list(lateness))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=10_000)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    results = {"rooms": args.rooms, "interval": args.interval, "duration": args.duration,
+               "scheduler": asyncio.run(run_scheduler(args.rooms, args.interval, args.duration))}
+    if not args.skip_legacy:
+        results["legacy"] = run_legacy(args.rooms, args.interval, args.duration)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,127 @@
-import os
+"""
+Generate the OpenAPI spec, the AsyncAPI spec of each socket.io namespace and
+the JSON Schema of each entity under schemas/.
+
+Each target records a fingerprint of the sources under app/, the resolved
+settings and the versions of the packages that generate the schemas in
+schemas/.fingerprints.json, and is skipped while they are unchanged, without
+importing the app. The AsyncAPI specs and entity schemas import the socket
+namespaces and app.core.schemas, which do not import app.app or create the
+database engine; app.main is only imported for the OpenAPI spec, as that
+needs every route. Each model's schema
+is computed once, and nested models are defined once per AsyncAPI spec under
+components.schemas. Files are only written when their
+content changes, so unchanged specs keep their timestamps.
+
+Usage: uv run scripts/schemas.py [--force] [--targets openapi asyncapi entities]
+"""
 import sys
 import json
+import hashlib
 import inspect
+import argparse
 from pathlib import Path
+from importlib import metadata
+
+ROOT = Path(__file__).parent.parent
+SCHEMAS_DIR = ROOT / "schemas"
+FINGERPRINTS = SCHEMAS_DIR / ".fingerprints.json"
+TARGETS = ("openapi", "asyncapi", "entities")
+# packages whose output ends up in the schemas
+PACKAGES = ("fastapi", "pydantic", "pydantic-core", "python-socketio", "sqlalchemy")
+
+sys.path.append(str(ROOT))
+
 
-from pydantic import BaseModel
-from fastapi.openapi.utils import get_openapi
+def fingerprint() -> str:
+    digest = hashlib.sha256()
+    for path in sorted([*(ROOT / "app").rglob("*.py"), Path(__file__)]):
+        digest.update(path.relative_to(ROOT).as_posix().encode("utf-8"))
+        digest.update(path.read_bytes())
+    # settings such as STATE_SYNC and SOCKET_SERIALIZER change the specs too, from .env or the environment
+    from app.core.config import get_settings
+    digest.update(get_settings().model_dump_json().encode("utf-8"))
+    for package in PACKAGES:
+        digest.update(f"{package}=={metadata.version(package)}".encode("utf-8"))
+    return digest.hexdigest()
 
-sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
-from app.main import app
-from app.core import schemas
-from app.core.sockets import generate_asyncapi
+def write_if_changed(path: Path, text: str) -> bool:
+    data = text.encode("utf-8")
+    if path.is_file() and hashlib.sha256(path.read_bytes()).digest() == hashlib.sha256(data).digest():
+        return False
+    path.write_bytes(data)
+    return True
 
-with open(Path(__file__).parent.parent / "schemas" / "openapi.json", 'w') as f:
-    json.dump(get_openapi(
+
+def openapi() -> dict[str, str]:
+    from fastapi.openapi.utils import get_openapi
+
+    from app.main import app
+
+    spec = get_openapi(
         title=app.title,
         version=app.version,
         openapi_version=app.openapi_version,
         description=app.description,
         routes=app.routes,
-    ), f, indent=2)
+    )
+    return {"openapi.json": json.dumps(spec, indent=2)}
+
+
+def asyncapi() -> dict[str, str]:
+    # registering the namespaces fills the socket_event registry
+    import app.api.v1.sockets  # noqa: F401
+    from app.core.config import APP_TITLE, APP_VERSION
+    from app.core.sockets import asyncapi_specs
+
+    specs = asyncapi_specs(title=APP_TITLE, version=APP_VERSION, url="localhost:8000")
+    return {f"asyncapi/{name}": json.dumps(spec, indent=2, sort_keys=False) for name, spec in specs.items()}
+
+
+def entities() -> dict[str, str]:
+    from pydantic import BaseModel
+
+    from app.core import schemas
+    from app.core.sockets import model_schema
+
+    # adds the schemas derived from the ORM models
+    schemas.configure_schemas()
+    files = {}
+    for name, model in inspect.getmembers(schemas):
+        if inspect.isclass(model) and issubclass(model, BaseModel) and name != "BaseModel":
+            schema, defs = model_schema(model, "#/$defs/{model}")
+            files[f"entities/{model.__name__}.schema.json"] = json.dumps({"$defs": defs, **schema} if defs else schema,
+                                                                          indent=2)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--force", action="store_true", help="regenerate even if nothing the schemas depend on changed")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    args = parser.parse_args()
+
+    current = fingerprint()
+    recorded = json.loads(FINGERPRINTS.read_text()) if FINGERPRINTS.is_file() else {}
+    stale = [target for target in args.targets if args.force or recorded.get(target) != current]
+    if not stale:
+        print("Schemas are up to date")
+        return
 
-out = Path(__file__).parent.parent / "schemas" / "asyncapi"
-generate_asyncapi(out, title=app.title, version=app.version, url="localhost:8000")
+    generators = {"openapi": openapi, "asyncapi": asyncapi, "entities": entities}
+    written = 0
+    for target in stale:
+        for name, text in generators[target]().items():
+            path = SCHEMAS_DIR / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if write_if_changed(path, text):
+                written += 1
+                print(f"Wrote {path.relative_to(ROOT)}")
+        recorded[target] = current
+    write_if_changed(FINGERPRINTS, json.dumps(recorded, indent=2, sort_keys=True))
+    print(f"Generated {', '.join(stale)}: {written} file(s) changed")
 
-out = Path(__file__).parent.parent / "schemas" / "entities"
-out.mkdir(exist_ok=True)
 
-for name, model in inspect.getmembers(schemas):
-    if inspect.isclass(model) and issubclass(model, BaseModel) and name != "BaseModel":
-        with open(out / f"{model.__name__}.schema.json", "w") as f:
-            json.dump(model.model_json_schema(), f, indent=2)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+import os
+import sys
+from pathlib import Path
+
+# settings are read when app modules are imported, so they have to be in place first
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("CACHE_HOST", "localhost")
+os.environ.setdefault("CACHE_ENABLED", "false")
+os.environ.setdefault("METRICS_USERNAME", "metrics")
+os.environ.setdefault("METRICS_PASSWORD", "metrics")
+os.environ.setdefault("VITE_BACKEND", "http://localhost:8000")
+os.environ.setdefault("VITE_SOCKET_SERVER", "http://localhost:8000")
+os.environ.setdefault("VITE_SOCKET_PATH", "/ws/socket.io")
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
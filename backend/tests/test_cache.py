@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from fastapi_cache.types import Backend
+
+from app.core.cache import CoalescingBackend
+
+
+class DictBackend(Backend):
+    def __init__(self):
+        self.values: dict[str, tuple[int, bytes]] = {}
+
+    async def get_with_ttl(self, key):
+        return self.values.get(key, (0, None))
+
+    async def get(self, key):
+        return self.values.get(key, (0, None))[1]
+
+    async def set(self, key, value, expire=None):
+        self.values[key] = (expire or -1, value)
+
+    async def clear(self, namespace=None, key=None):
+        self.values.clear()
+        return 0
+
+
+@pytest.fixture
+def backend():
+    return CoalescingBackend(DictBackend(), lease=5.0)
+
+
+async def test_concurrent_misses_wait_for_the_leader(backend):
+    assert await backend.get_with_ttl("k") == (0, None)
+    waiters = [asyncio.create_task(backend.get_with_ttl("k")) for _ in range(3)]
+    await asyncio.sleep(0)
+    await backend.set("k", b"v", 10)
+    assert await asyncio.gather(*waiters) == [(10, b"v")] * 3
+
+
+async def test_failed_leader_hands_the_key_to_a_waiter(backend):
+    computed = []
+
+    async def request(fail: bool = False):
+        # what fastapi-cache's decorator does around the endpoint
+        _, value = await backend.get_with_ttl("k")
+        if value is None:
+            computed.append(fail)
+            await asyncio.sleep(0.01)
+            if fail:
+                raise RuntimeError("handler failed")
+            value = b"v"
+            await backend.set("k", value, 10)
+        return value
+
+    leader = asyncio.create_task(request(fail=True))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(request()) for _ in range(3)]
+    with pytest.raises(RuntimeError):
+        await leader
+    # well within the lease, one waiter computes the value for the others
+    assert await asyncio.wait_for(asyncio.gather(*waiters), 1) == [b"v"] * 3
+    assert computed == [True, False]
+
+
+async def test_jitter_spreads_short_ttls():
+    inner = DictBackend()
+    backend = CoalescingBackend(inner, jitter=0.1)
+    ttls = set()
+    for _ in range(200):
+        await backend.set("k", b"v", 5)
+        ttls.add(inner.values["k"][0])
+    assert ttls == {5, 6}
@@ -0,0 +1,17 @@
+import io
+import logging
+
+from app.core.logger import Logger
+
+
+def test_arguments_are_logged_as_they_were_at_the_call():
+    out = io.StringIO()
+    logger = Logger("test-logger", stdout=out, stderr=io.StringIO())
+    state = {"room": "a"}
+    logger.info("joined", state)
+    logging.getLogger("test-logger").info("left %s", state)
+    state["room"] = "MUTATED"
+    logger.close()
+    lines = out.getvalue().splitlines()
+    assert lines[0].endswith("joined {'room': 'a'}")
+    assert lines[1].endswith("left {'room': 'a'}")
@@ -0,0 +1,59 @@
+import asyncio
+
+from fakeredis import aioredis as fakeredis
+
+from app.core.state import RedisSessionStore, SessionStore, SignedSessionStore
+
+SECRET = "test-secret"
+
+
+async def test_signed_sessions_validate_until_revoked():
+    sessions = SignedSessionStore(SessionStore(), SECRET)
+    session = await sessions.create_session(60)
+    assert await sessions.validate_session(session)
+    await sessions.revoke_session(session)
+    assert not await sessions.validate_session(session)
+
+
+async def test_signed_sessions_reject_a_bad_signature():
+    sessions = SignedSessionStore(SessionStore(), SECRET)
+    session = await sessions.create_session(60)
+    other = SignedSessionStore(SessionStore(), "another-secret")
+    assert not await other.validate_session(session)
+    assert not await sessions.validate_session(session[:-1])
+
+
+async def test_signed_session_logout_applies_to_every_worker():
+    redis = fakeredis.FakeRedis()
+    a = SignedSessionStore(RedisSessionStore(redis, prefix="test"), SECRET)
+    b = SignedSessionStore(RedisSessionStore(redis, prefix="test"), SECRET)
+    session = await a.create_session(60)
+    assert await b.validate_session(session)
+    await a.revoke_session(session)
+    assert not await b.validate_session(session)
+    nonce = session.split(".")[1]
+    assert 0 < await redis.ttl(f"test:revoked:{nonce}") <= 61
+
+
+async def test_revocations_are_checked_in_memory_once_loaded(monkeypatch):
+    redis = fakeredis.FakeRedis()
+    a = RedisSessionStore(redis, prefix="test")
+    b = RedisSessionStore(redis, prefix="test")
+    await a.revoke("before", 60)
+    # looked up in Redis while b loads the list
+    assert await b.is_revoked("before")
+    await asyncio.wait_for(b._synced.wait(), 1)
+    await a.revoke("after", 60)
+
+    async def exists(*_keys):
+        raise AssertionError("looked up in Redis")
+
+    monkeypatch.setattr(redis, "exists", exists)
+    for _ in range(100):
+        if await b.is_revoked("after"):
+            break
+        await asyncio.sleep(0.01)
+    assert await b.is_revoked("before")
+    assert await b.is_revoked("after")
+    assert not await b.is_revoked("never")
+    b._watcher.cancel()
@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+import socketio
+
+from app.core import schemas
+from app.core.sockets import sio, socket_event, socket_namespace
+
+WINDOW = 0.016
+
+
+class RecordingNamespace(socketio.AsyncNamespace):
+    def __init__(self, namespace=None):
+        super().__init__(namespace)
+        self.rooms: dict[str, str] = {}
+        self.state: dict[str, float] = {}
+        self.emitted: list[tuple] = []
+
+    def room_of(self, sid: str) -> str | None:
+        return self.rooms.get(sid)
+
+    async def emit(self, event, data=None, room=None, **kwargs):
+        self.emitted.append((event, data, room))
+
+    async def on_disconnect(self, sid: str, _reason):
+        self.rooms.pop(sid, None)
+
+
+@socket_namespace("/test-coalesce")
+class CoalescedNamespace(RecordingNamespace):
+    @socket_event(
+        "arc_width_update",
+        payload=schemas.ArcWidthUpdatePayload,
+        response=schemas.ArcWidthUpdatePayload,
+        response_event="arc_width_update",
+        rate="60/second",
+        room_rate="120/second",
+        coalesce=WINDOW,
+    )
+    async def on_arc_width_update(self, sid: str, data: schemas.ArcWidthUpdatePayload):
+        # like the store, a room that is gone cannot be updated
+        self.state[self.rooms[sid]] = data.arc_width
+        return data
+
+
+@socket_namespace("/test-trailing")
+class TrailingNamespace(RecordingNamespace):
+    @socket_event(
+        "arc_width_update",
+        payload=schemas.ArcWidthUpdatePayload,
+        response=schemas.ArcWidthUpdatePayload,
+        response_event="arc_width_update",
+        rate="10/second",
+        trailing=True,
+    )
+    async def on_arc_width_update(self, sid: str, data: schemas.ArcWidthUpdatePayload):
+        # like the store, a room that is gone cannot be updated
+        self.state[self.rooms[sid]] = data.arc_width
+        return data
+
+
+def _reset(path: str):
+    namespace = sio.namespace_handlers[path]
+    namespace.rooms.clear()
+    namespace.state.clear()
+    namespace.emitted.clear()
+    return namespace
+
+
+@pytest.fixture
+def namespace():
+    return _reset("/test-coalesce")
+
+
+@pytest.fixture
+def trailing():
+    return _reset("/test-trailing")
+
+
+async def test_a_coalesced_burst_is_not_rate_limited_and_ends_on_its_last_value(namespace):
+    namespace.rooms["a"] = "room"
+    # a 200 Hz drag for 1.5 s: five times the per-socket limit
+    for width in range(1, 301):
+        await namespace.on_arc_width_update("a", {"arc_width": width})
+        await asyncio.sleep(0.005)
+    await asyncio.sleep(WINDOW * 3)
+    assert [e for e in namespace.emitted if e[0] == "error"] == []
+    assert namespace.state["room"] == 300
+    assert namespace.emitted[-1] == ("arc_width_update", schemas.ArcWidthUpdatePayload(arc_width=300), "room")
+
+
+async def test_events_held_back_from_a_disconnecting_sender_are_applied_in_its_room(namespace):
+    namespace.rooms.update(a="room", b="room")
+    await namespace.on_arc_width_update("a", {"arc_width": 1})
+    await namespace.on_arc_width_update("a", {"arc_width": 2})
+    await namespace.trigger_event("disconnect", "a", "client disconnect")
+    assert namespace.state["room"] == 2
+    assert namespace.emitted[-1] == ("arc_width_update", schemas.ArcWidthUpdatePayload(arc_width=2), "room")
+    await asyncio.sleep(WINDOW * 3)
+    assert namespace.emitted.count(("arc_width_update", schemas.ArcWidthUpdatePayload(arc_width=2), "room")) == 1
+
+
+async def test_a_burst_ending_over_the_rate_limit_still_ends_on_its_last_value(trailing):
+    trailing.rooms["t"] = "room"
+    # three times the bucket, at once: the last 20 events are over the limit
+    for width in range(1, 31):
+        await trailing.on_arc_width_update("t", {"arc_width": width})
+    assert trailing.state["room"] == 10
+    await asyncio.sleep(0.3)
+    assert [e for e in trailing.emitted if e[0] == "error"] == []
+    assert trailing.state["room"] == 30
+    # the held back events were merged into one
+    assert len(trailing.emitted) == 11
+
+
+async def test_an_event_held_back_from_a_disconnecting_sender_is_applied_in_its_room(trailing):
+    trailing.rooms["u"] = "room"
+    for width in range(1, 13):
+        await trailing.on_arc_width_update("u", {"arc_width": width})
+    await trailing.trigger_event("disconnect", "u", "client disconnect")
+    assert trailing.state["room"] == 12
+    await asyncio.sleep(0.3)
+    assert trailing.emitted.count(("arc_width_update", schemas.ArcWidthUpdatePayload(arc_width=12), "room")) == 1
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+from fakeredis import aioredis as fakeredis
+
+from app.api.v1.state import RoomStateStore, RedisRoomStateStore
+
+
+@pytest.fixture
+def store():
+    return RoomStateStore(history_size=4)
+
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeRedis()
+
+
+async def test_synced_updates_bump_the_version(store):
+    await store.init("r")
+    await store.update("r", text="a")
+    await store.update("r", arc_width=2.0)
+    # tick is not synced, so it neither bumps the version nor produces a patch
+    await store.update("r", tick=5)
+    assert await store.version("r") == 2
+    assert store.last_patch("r") == {"from_version": 1, "to_version": 2, "patch": {"arc_width": 2.0}}
+
+
+async def test_delta_merges_the_patches_since_a_version(store):
+    await store.init("r")
+    await store.update("r", text="a")
+    await store.update("r", text="b", arc_width=3.0)
+    await store.update("r", arc_width=4.0)
+    assert await store.delta("r", 1) == {"from_version": 1, "to_version": 3, "patch": {"text": "b", "arc_width": 4.0}}
+    assert await store.delta("r", 3) == {"from_version": 3, "to_version": 3, "patch": {}}
+
+
+async def test_delta_is_none_once_the_history_no_longer_covers_it(store):
+    await store.init("r")
+    for i in range(6):
+        await store.update("r", arc_width=float(i))
+    # history_size=4 keeps versions 2 -> 6
+    assert await store.delta("r", 1) is None
+    assert (await store.delta("r", 2))["to_version"] == 6
+    assert await store.delta("r", 99) is None
+    assert await store.delta("unknown", 0) is None
+
+
+async def test_reset_bumps_the_version_with_every_synced_field(store):
+    await store.init("r")
+    await store.update("r", text="a")
+    await store.reset("r")
+    patch = store.last_patch("r")
+    assert patch["to_version"] == 2
+    assert patch["patch"]["text"] == ""
+    assert set(patch["patch"]) == {"status", "timestamp", "text", "arc_width", "select_county_event"}
+
+
+async def test_clear_forgets_the_room(store):
+    await store.init("r")
+    await store.update("r", text="a")
+    await store.clear("r")
+    assert store.get("r") is None
+    assert await store.version("r") == 0
+
+
+async def test_redis_writes_are_flushed_and_shared(redis):
+    a = RedisRoomStateStore(redis, prefix="test", flush_interval=0.01)
+    b = RedisRoomStateStore(redis, prefix="test", flush_interval=0.01)
+    await a.init("r")
+    await b.init("r")
+    await a.update("r", text="from a")
+    await a.flush()
+    state_ = await b.load("r")
+    assert state_.text == "from a"
+    assert state_.version == 1
+    assert await b.version("r") == 1
+
+
+async def test_redis_versions_from_different_workers_do_not_collide(redis):
+    a = RedisRoomStateStore(redis, prefix="test")
+    b = RedisRoomStateStore(redis, prefix="test")
+    await a.init("r")
+    await b.init("r")
+    await a.update("r", text="a")
+    await b.update("r", arc_width=2.0)
+    await asyncio.gather(a.flush(), b.flush())
+    assert int(await redis.hget("test:r", "version")) == 2
+
+
+async def test_redis_workers_never_hand_out_the_same_patch_version(redis):
+    a = RedisRoomStateStore(redis, prefix="test")
+    b = RedisRoomStateStore(redis, prefix="test")
+    await a.init("r")
+    await b.init("r")
+    await asyncio.gather(a.update("r", text="from a"), b.update("r", arc_width=2.0))
+    await a.update("r", select_county_event=None)
+    patches = [a.last_patch("r"), b.last_patch("r")]
+    versions = sorted(p["to_version"] for p in [*a._history["r"], *b._history["r"]])
+    assert versions == [1, 2, 3]
+    assert all(p["from_version"] == p["to_version"] - 1 for p in patches)
+    assert await a.version("r") == await b.version("r") == 3
+
+
+async def test_redis_version_means_the_same_state_on_every_worker(redis):
+    a = RedisRoomStateStore(redis, prefix="test", flush_interval=60)
+    b = RedisRoomStateStore(redis, prefix="test", flush_interval=60)
+    await a.init("r")
+    await b.init("r")
+    await a.update("r", text="from a")
+    await b.update("r", arc_width=2.0)
+    # both workers report the version of the state that includes both writes, before any flush
+    assert await a.version("r") == await b.version("r") == 2
+    snapshots = [(await store.load("r")).to_dict() for store in (a, b)]
+    assert snapshots[0] == snapshots[1]
+    assert snapshots[0]["text"] == "from a" and snapshots[0]["arc_width"] == 2.0
+
+
+async def test_redis_unsynced_writes_are_batched_without_a_version(redis):
+    a = RedisRoomStateStore(redis, prefix="test", flush_interval=60)
+    await a.init("r")
+    await a.update("r", tick=3)
+    assert await redis.hget("test:r", "tick") == b"0"
+    await a.update("r", text="t")
+    # the pending tick goes out with the synced write, before it
+    assert await redis.hmget("test:r", "tick", "version") == [b"3", b"1"]
+    assert a.last_patch("r") == {"from_version": 0, "to_version": 1, "patch": {"text": "t"}}
+
+
+async def test_redis_room_is_deleted_by_the_last_worker_to_leave(redis):
+    a = RedisRoomStateStore(redis, prefix="test")
+    b = RedisRoomStateStore(redis, prefix="test")
+    await a.init("r")
+    await b.init("r")
+    await a.clear("r")
+    assert await redis.exists("test:r") == 1
+    await b.clear("r")
+    assert await redis.exists("test:r", "test:r:workers") == 0
+
+
+async def test_redis_clear_keeps_a_room_another_worker_joined(redis):
+    a = RedisRoomStateStore(redis, prefix="test")
+    b = RedisRoomStateStore(redis, prefix="test")
+    await a.init("r")
+    await asyncio.gather(a.clear("r"), b.init("r"))
+    # whichever ran first, b is registered and its hash exists
+    assert await redis.sismember("test:r:workers", b.worker_id)
+    assert await redis.exists("test:r") == 1
+
+
+async def test_redis_ticker_has_one_owner_until_it_hands_it_over(redis):
+    a = RedisRoomStateStore(redis, prefix="test")
+    b = RedisRoomStateStore(redis, prefix="test")
+    await a.init("r")
+    await b.init("r")
+    assert [await a.claim_ticker("r"), await b.claim_ticker("r")] == [True, False]
+    assert [await a.claim_ticker("r"), await b.claim_ticker("r")] == [True, False]
+    # a's last member leaves while b still has members
+    await a.clear("r")
+    assert [await a.claim_ticker("r"), await b.claim_ticker("r")] == [False, True]
+
+
+async def test_redis_ticker_is_taken_over_once_its_owner_stops_renewing_it(redis):
+    a = RedisRoomStateStore(redis, prefix="test", ticker_lease=0.05)
+    b = RedisRoomStateStore(redis, prefix="test", ticker_lease=0.05)
+    await a.init("r")
+    await b.init("r")
+    assert await a.claim_ticker("r")
+    await asyncio.sleep(0.1)
+    assert await b.claim_ticker("r")
+    assert not await a.claim_ticker("r")
+
+
+async def test_updates_initialise_a_room_that_is_still_connecting():
+    store = RoomStateStore()
+    await store.update("r", status="running")
+    assert store.get("r").status == "running"
+    assert await store.version("r") == 1
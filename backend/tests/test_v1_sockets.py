@@ -0,0 +1,71 @@
+import pytest
+from fakeredis import aioredis as fakeredis
+
+from app.api.v1 import sockets as v1
+from app.api.v1.state import RedisRoomStateStore
+
+
+class Worker:
+    """One worker's namespace and room state store, sharing Redis with the others."""
+
+    def __init__(self, redis, monkeypatch):
+        self.store = RedisRoomStateStore(redis, prefix="test")
+        self.namespace = v1.SocketV1Namespace("/v1")
+        self.namespace._emit_on_tick = self._record_tick
+        self.monkeypatch = monkeypatch
+        self.ticks = 0
+
+    async def _record_tick(self, _room):
+        self.ticks += 1
+
+    async def on_tick(self, room: str):
+        self.monkeypatch.setattr(v1, "store", self.store)
+        await self.namespace._on_tick(room)
+        await self.store.flush()
+
+
+@pytest.fixture
+def workers(monkeypatch):
+    redis = fakeredis.FakeRedis()
+    return Worker(redis, monkeypatch), Worker(redis, monkeypatch)
+
+
+async def tick_all(workers, rounds: int = 1):
+    for _ in range(rounds):
+        for worker in workers:
+            await worker.on_tick("r")
+
+
+async def test_only_one_worker_ticks_a_room(workers):
+    a, b = workers
+    await a.store.init("r")
+    await b.store.init("r")
+    await a.store.update("r", status="running")
+    await tick_all(workers, rounds=3)
+    assert (a.ticks, b.ticks) == (3, 0)
+    assert (await b.store.load("r")).tick == 3
+
+
+async def test_a_restart_on_another_worker_does_not_tick_twice(workers):
+    a, b = workers
+    await a.store.init("r")
+    await b.store.init("r")
+    await a.store.update("r", status="running")
+    await tick_all(workers)
+    # stopped on a and started again on b within one interval
+    await a.store.update("r", status="stopped")
+    await b.store.update("r", status="running")
+    await tick_all(workers, rounds=2)
+    assert a.ticks + b.ticks == 3
+
+
+async def test_ticks_carry_on_when_the_ticking_worker_loses_its_members(workers):
+    a, b = workers
+    await a.store.init("r")
+    await b.store.init("r")
+    await a.store.update("r", status="running")
+    await tick_all(workers)
+    await a.store.clear("r")
+    await tick_all(workers, rounds=2)
+    assert (a.ticks, b.ticks) == (1, 2)
+    assert (await b.store.load("r")).tick == 3